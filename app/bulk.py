@@ -0,0 +1,414 @@
+import logging
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import select, update, insert, delete, bindparam, or_, case, text, func
+from sqlalchemy import Table, Column, MetaData, Index, BigInteger, Integer, String, Text, Boolean, DateTime
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from sqlalchemy.dialects import postgresql as pg_dialect
+
+from . import models, search
+
+logger = logging.getLogger("app.bulk")
+
+# Columns an import overwrites on an existing product (matches the old per-row ORM update)
+UPDATE_COLUMNS = ("sku", "name", "description", "content_hash", "updated_at")
+
+def normalize_row(row: dict):
+    sku = (row.get("sku") or "").strip()
+    if not sku:
+        return None
+    name = (row.get("name") or sku).strip()
+    description = (row.get("description") or "").strip()
+    return {"sku": sku, "sku_lower": sku.lower(), "name": name, "description": description}
+
+class ProductBatch:
+    # Collects normalized rows keyed by sku_lower; a later row replaces an earlier one (last row wins)
+    def __init__(self):
+        self.rows: dict[str, dict] = {}
+        self.count = 0
+
+    def add(self, row: dict, offset: int | None = None) -> bool:
+        item = normalize_row(row)
+        if item is None:
+            return False
+        if offset is not None:
+            item["import_offset"] = offset
+        self.rows[item["sku_lower"]] = item
+        self.count += 1
+        return True
+
+    def extend(self, items: list[dict]):
+        # Rows already normalized (e.g. by the columnar parser), in file order
+        for item in items:
+            self.rows[item["sku_lower"]] = item
+        self.count += len(items)
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.rows = {}
+        self.count = 0
+
+def _dialect_insert(dialect_name: str):
+    if dialect_name == "sqlite":
+        return sqlite_dialect.insert
+    if dialect_name == "postgresql":
+        return pg_dialect.insert
+    return None
+
+def _on_conflict_upsert(db, items: list[dict], dialect_insert, columns, guarded: bool):
+    table = models.Product.__table__
+    stmt = dialect_insert(table)
+    where = None
+    if guarded:
+        where = or_(
+            table.c.import_job_id.is_distinct_from(stmt.excluded.import_job_id),
+            table.c.import_offset < stmt.excluded.import_offset,
+        )
+    set_ = {c: getattr(stmt.excluded, c) for c in columns}
+    set_["updated_at"] = _keep_updated_at(stmt.excluded.content_hash, stmt.excluded.updated_at)
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.sku_lower], set_=set_, where=where)
+    if guarded:
+        # Other chunks write the same SKUs concurrently: report what this statement did to each
+        # row it wrote. Only a new row has this batch's created_at, and only a changed one its updated_at
+        rows = db.execute(stmt.returning(table.c.sku_lower, table.c.created_at, table.c.updated_at), items)
+        return {r.sku_lower: (r.created_at, r.updated_at) for r in rows}
+    db.execute(stmt, items)
+    return None
+
+def _keep_updated_at(new_hash, new_updated_at):
+    # Rows rewritten only to claim them for a parallel import keep their updated_at
+    table = models.Product.__table__
+    return case((table.c.content_hash == new_hash, table.c.updated_at), else_=new_updated_at)
+
+def _core_upsert(db, items: list[dict], existing: dict, columns, guarded: bool):
+    # Portable fallback: executemany UPDATE / INSERT split on the batch's existing rows
+    table = models.Product.__table__
+    updates = []
+    inserts = []
+    for i in items:
+        cur = existing.get(i["sku_lower"])
+        if cur is None:
+            inserts.append(i)
+        elif not guarded or cur.import_job_id != i["import_job_id"] or (cur.import_offset or 0) < i["import_offset"]:
+            updates.append({f"b_{c}": i[c] for c in columns + ("sku_lower",)})
+    if updates:
+        values = {c: bindparam(f"b_{c}") for c in columns}
+        values["updated_at"] = _keep_updated_at(bindparam("b_content_hash"), bindparam("b_updated_at"))
+        stmt = update(table).where(table.c.sku_lower == bindparam("b_sku_lower")).values(values)
+        db.execute(stmt, updates)
+    if inserts:
+        db.execute(insert(table), inserts)
+
+def _existing_rows(db, keys: list[str]) -> dict:
+    table = models.Product.__table__
+    rows = db.execute(
+        select(table.c.sku_lower, table.c.id, table.c.content_hash, table.c.import_job_id, table.c.import_offset).where(table.c.sku_lower.in_(keys))
+    )
+    return {r.sku_lower: r for r in rows}
+
+def upsert_products(db, rows, job_id: str | None = None, outcomes: dict | None = None) -> Counter:
+    """Insert or update a batch of normalized product rows keyed by sku_lower.
+
+    ``rows`` is an iterable of dicts with sku, sku_lower, name and description, already
+    deduplicated on sku_lower. One SELECT compares them with the stored content hashes and
+    rows that did not change are not written. With ``job_id`` every row must also carry
+    ``import_offset`` and only replaces a product last written by another job or by an
+    earlier record of the same job; its counts come from the rows the upsert actually
+    wrote, since parallel chunks race on the same SKUs. Does not commit. Returns a Counter
+    of ``inserted``, ``updated`` and ``unchanged`` rows; ``outcomes``, if given, maps each
+    row's sku_lower to (outcome, id), where id is None for inserted rows.
+    """
+    now = datetime.utcnow()
+    guarded = job_id is not None
+    columns = UPDATE_COLUMNS + (("import_job_id", "import_offset") if guarded else ())
+    extra = {"import_job_id": job_id} if guarded else {}
+    items = [
+        dict(r, active=True, created_at=now, updated_at=now, content_hash=models.product_hash(r["sku"], r["name"], r["description"]), **extra)
+        for r in rows
+    ]
+    counts = Counter()
+    if not items:
+        return counts
+    dialect_name = db.get_bind().dialect.name
+    if guarded or dialect_name == "postgresql":
+        # Sorted keys give concurrent writers a consistent row lock order; otherwise new
+        # products keep file order, and with it their ids
+        items.sort(key=lambda i: i["sku_lower"])
+    existing = _existing_rows(db, [i["sku_lower"] for i in items])
+    writes = []
+    planned = {}
+    for i in items:
+        cur = existing.get(i["sku_lower"])
+        if cur is None:
+            outcome = "inserted"
+            writes.append(i)
+        elif cur.content_hash != i["content_hash"]:
+            outcome = "updated"
+            writes.append(i)
+        else:
+            outcome = "unchanged"
+            # Parallel chunks: the row still records this job and offset (content and updated_at
+            # stay), or an earlier, different record of the same SKU in another chunk could overwrite it
+            if guarded and (cur.import_job_id != job_id or (cur.import_offset or 0) < i["import_offset"]):
+                writes.append(i)
+        planned[i["sku_lower"]] = (outcome, cur.id if cur is not None else None)
+    written = None
+    dialect_insert = _dialect_insert(dialect_name)
+    if writes and dialect_insert is not None:
+        written = _on_conflict_upsert(db, writes, dialect_insert, columns, guarded)
+    elif writes:
+        _core_upsert(db, writes, existing, columns, guarded)
+    for key, (outcome, product_id) in planned.items():
+        if written is not None:
+            # Not written: unchanged, or another chunk already wrote a later record of this SKU
+            created_at, updated_at = written.get(key, (None, None))
+            outcome = "inserted" if created_at == now else "updated" if updated_at == now else "unchanged"
+        counts[outcome] += 1
+        if outcomes is not None:
+            outcomes[key] = (outcome, product_id)
+    return counts
+
+def product_ids(db, keys: list[str]) -> dict[str, int]:
+    table = models.Product.__table__
+    return {r.sku_lower: r.id for r in db.execute(select(table.c.sku_lower, table.c.id).where(table.c.sku_lower.in_(keys)))}
+
+def delete_products(db, keys: list[str]) -> dict[str, int]:
+    """Delete the products with these sku_lower values. Does not commit.
+
+    Returns sku_lower -> id for the products that existed.
+    """
+    found = product_ids(db, keys)
+    if found:
+        table = models.Product.__table__
+        db.execute(delete(table).where(table.c.sku_lower.in_(list(found))))
+    return found
+
+# PostgreSQL COPY staging import
+_WS = r"E' \t\r\n\f\v'"
+
+def copy_merge_products(db, csv_file, fieldnames: list[str]) -> tuple[int, int, Counter]:
+    """Stream a CSV file into a temp staging table with COPY and merge it into products.
+
+    ``csv_file`` is a readable text or binary stream positioned at the header line and
+    ``fieldnames`` its parsed header. Duplicates on lower(sku) inside the file keep the
+    last occurrence; products whose content hash matches are left untouched. Does not
+    commit. Returns (staged_rows, rows_with_sku, Counter of inserted/updated/unchanged).
+    """
+    cols = [f"c{i}" for i in range(len(fieldnames))]
+    # csv.DictReader keeps the last column when a header repeats
+    by_header = dict(zip(fieldnames, cols))
+    col = lambda h: by_header.get(h, "NULL::text")
+    sku = f"btrim(coalesce({col('sku')}, ''), {_WS})"
+    name = f"btrim(coalesce(nullif({col('name')}, ''), {col('sku')}, ''), {_WS})"
+    description = f"btrim(coalesce({col('description')}, ''), {_WS})"
+
+    cur = db.connection().connection.cursor()
+    try:
+        cur.execute(
+            "CREATE TEMP TABLE products_staging (seq bigserial, "
+            + ", ".join(f"{c} text" for c in cols)
+            + ") ON COMMIT DROP"
+        )
+        cur.copy_expert(
+            f"COPY products_staging ({', '.join(cols)}) FROM STDIN WITH (FORMAT csv, HEADER true)",
+            csv_file,
+            size=1 << 20,
+        )
+        cur.execute("SELECT count(*) FROM products_staging")
+        staged = cur.fetchone()[0]
+        # Unchanged rows are skipped by the WHERE; xmax = 0 marks rows that were inserted
+        cur.execute(
+            f"""
+            WITH merged AS (
+                INSERT INTO products (sku, sku_lower, name, description, content_hash, active, created_at, updated_at)
+                SELECT sku, lower(sku), name, description, md5(sku || E'\\x1f' || name || E'\\x1f' || description),
+                       true, now() at time zone 'utc', now() at time zone 'utc'
+                FROM (
+                    SELECT DISTINCT ON (lower({sku})) {sku} AS sku, {name} AS name, {description} AS description
+                    FROM products_staging
+                    WHERE {sku} <> ''
+                    ORDER BY lower({sku}), seq DESC
+                ) latest
+                ON CONFLICT (sku_lower) DO UPDATE
+                SET sku = EXCLUDED.sku, name = EXCLUDED.name, description = EXCLUDED.description,
+                    content_hash = EXCLUDED.content_hash, updated_at = EXCLUDED.updated_at
+                WHERE products.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM merged
+            """
+        )
+        inserted, updated = cur.fetchone()
+        cur.execute(f"SELECT count(*), count(DISTINCT lower({sku})) FROM products_staging WHERE {sku} <> ''")
+        valid, distinct = cur.fetchone()
+    finally:
+        cur.close()
+    counts = Counter(inserted=inserted, updated=updated, unchanged=distinct - inserted - updated)
+    logger.info("COPY import staged %s rows, %s with a sku: %s", staged, valid, dict(counts))
+    return staged, valid, counts
+
+# Full-catalog replace: shadow table built in one pass, swapped in by rename
+_COPY_COLUMNS = "sku, sku_lower, name, description, content_hash"
+_SHADOW_COLUMNS = "id, sku, sku_lower, name, description, active, created_at, updated_at, content_hash"
+_FILL_SHADOW = {
+    # Products still listed keep their id, active flag and created_at; unchanged ones also updated_at
+    "unchanged": f"""
+        INSERT INTO products_shadow ({_SHADOW_COLUMNS})
+        SELECT p.id, l.sku, l.sku_lower, l.name, l.description, p.active, p.created_at, p.updated_at, l.content_hash
+        FROM products_latest l JOIN products p ON p.sku_lower = l.sku_lower
+        WHERE p.content_hash = l.content_hash
+    """,
+    "updated": f"""
+        INSERT INTO products_shadow ({_SHADOW_COLUMNS})
+        SELECT p.id, l.sku, l.sku_lower, l.name, l.description, p.active, p.created_at, :now, l.content_hash
+        FROM products_latest l JOIN products p ON p.sku_lower = l.sku_lower
+        WHERE p.content_hash IS NULL OR p.content_hash <> l.content_hash
+    """,
+    "inserted": f"""
+        INSERT INTO products_shadow ({_SHADOW_COLUMNS})
+        SELECT :next_id + row_number() OVER (ORDER BY l.seq), l.sku, l.sku_lower, l.name, l.description, :active, :now, :now, l.content_hash
+        FROM products_latest l
+        WHERE NOT EXISTS (SELECT 1 FROM products p WHERE p.sku_lower = l.sku_lower)
+    """,
+}
+
+def _shadow_table() -> Table:
+    # products without its secondary indexes; ids are copied or assigned, never generated
+    return Table(
+        "products_shadow",
+        MetaData(),
+        *(
+            Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable, autoincrement=False)
+            for c in models.Product.__table__.columns
+        ),
+    )
+
+class CatalogReplace:
+    """Replaces the whole products table with the rows of one file.
+
+    ``stage`` appends normalized rows to a temp table on a dedicated connection. ``swap``
+    keeps the last row per sku_lower, then in one transaction that locks out other writers
+    fills an unindexed shadow of products with a few INSERT ... SELECTs, indexes it once and
+    renames it over products. Readers see the old catalog until that transaction commits.
+    """
+
+    def __init__(self, engine):
+        self.conn = engine.connect()
+        self.seq = 0
+        self.staging = Table(
+            "products_replace",
+            MetaData(),
+            Column("seq", BigInteger),
+            Column("sku", String(120)),
+            Column("sku_lower", String(120)),
+            Column("name", String(255)),
+            Column("description", Text),
+            Column("content_hash", String(32)),
+            prefixes=["TEMPORARY"],
+        )
+        # Pooled connections keep temp tables from an earlier replace that failed
+        self._drop_temp()
+        self.staging.create(self.conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _drop_temp(self):
+        self.conn.exec_driver_sql("DROP TABLE IF EXISTS products_replace")
+        self.conn.exec_driver_sql("DROP TABLE IF EXISTS products_latest")
+        self.conn.commit()
+
+    def stage(self, rows: list[dict]):
+        # Normalized rows in file order; repeated SKUs are resolved in swap()
+        items = []
+        for r in rows:
+            self.seq += 1
+            items.append(dict(r, seq=self.seq, content_hash=models.product_hash(r["sku"], r["name"], r["description"])))
+        if items:
+            self.conn.execute(insert(self.staging), items)
+
+    def swap(self) -> Counter:
+        """Swap the staged catalog in. Returns a Counter of inserted/updated/unchanged/deleted."""
+        conn = self.conn
+        conn.exec_driver_sql(
+            f"CREATE TEMPORARY TABLE products_latest AS SELECT seq, {_COPY_COLUMNS} FROM ("
+            f"SELECT seq, {_COPY_COLUMNS}, row_number() OVER (PARTITION BY sku_lower ORDER BY seq DESC) AS rn "
+            "FROM products_replace) ranked WHERE rn = 1"
+        )
+        conn.commit()
+        dialect = conn.dialect.name
+        products = models.Product.__table__
+        shadow = _shadow_table()
+        try:
+            if dialect == "sqlite":
+                # pysqlite does not open a transaction for DDL; take the write lock up front
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+            elif dialect == "postgresql":
+                # Reads go on against the old table; writers wait until the swap commits
+                conn.exec_driver_sql("LOCK TABLE products IN EXCLUSIVE MODE")
+            conn.exec_driver_sql("DROP TABLE IF EXISTS products_shadow")
+            shadow.create(conn)
+            before = conn.execute(select(func.count()).select_from(products)).scalar()
+            params = {"now": datetime.utcnow(), "active": True, "next_id": self._next_id(dialect)}
+            types = {"now": DateTime, "active": Boolean, "next_id": Integer}
+            counts = Counter()
+            for outcome, sql in _FILL_SHADOW.items():
+                stmt = text(sql).bindparams(*(bindparam(k, type_=t) for k, t in types.items() if f":{k}" in sql))
+                counts[outcome] = conn.execute(stmt, {k: v for k, v in params.items() if f":{k}" in sql}).rowcount
+            counts["deleted"] = before - counts["unchanged"] - counts["updated"]
+            if dialect == "postgresql":
+                self._swap_postgres(shadow)
+            else:
+                conn.exec_driver_sql("DROP TABLE products")
+                conn.exec_driver_sql("ALTER TABLE products_shadow RENAME TO products")
+                # SQLite cannot rename indexes; build them under their own names now
+                for index in products.indexes:
+                    index.create(conn)
+                search.reindex_swapped(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info("Replace import swapped in %s products: %s", counts["inserted"] + counts["updated"] + counts["unchanged"], dict(counts))
+        return counts
+
+    def _next_id(self, dialect: str) -> int:
+        # New products get ids above every id handed out so far
+        top = self.conn.execute(select(func.coalesce(func.max(models.Product.id), 0))).scalar()
+        if dialect == "postgresql":
+            seq = self.conn.exec_driver_sql("SELECT pg_get_serial_sequence('products', 'id')").scalar()
+            if seq:
+                top = max(top, self.conn.exec_driver_sql(f"SELECT last_value FROM {seq}").scalar())
+        return top
+
+    def _swap_postgres(self, shadow: Table):
+        conn = self.conn
+        renames = []
+        for index in models.Product.__table__.indexes:
+            Index(f"{index.name}_shadow", *(shadow.c[c.name] for c in index.columns), unique=index.unique).create(conn)
+            renames.append((f"{index.name}_shadow", index.name))
+        renames += search.index_shadow(conn, "products_shadow")
+        seq = conn.exec_driver_sql("SELECT pg_get_serial_sequence('products', 'id')").scalar()
+        if seq:
+            # Dropping products would drop the sequence it owns
+            conn.exec_driver_sql(f"ALTER SEQUENCE {seq} OWNED BY products_shadow.id")
+            conn.exec_driver_sql(f"ALTER TABLE products_shadow ALTER COLUMN id SET DEFAULT nextval('{seq}')")
+            conn.exec_driver_sql(f"SELECT setval('{seq}', GREATEST((SELECT max(id) FROM products_shadow), (SELECT last_value FROM {seq})))")
+        conn.exec_driver_sql("DROP TABLE products")
+        conn.exec_driver_sql("ALTER TABLE products_shadow RENAME TO products")
+        conn.exec_driver_sql("ALTER TABLE products RENAME CONSTRAINT products_shadow_pkey TO products_pkey")
+        for tmp, name in renames:
+            conn.exec_driver_sql(f"ALTER INDEX {tmp} RENAME TO {name}")
+
+    def close(self):
+        try:
+            self._drop_temp()
+        except Exception as e:
+            logger.error(str(e))
+        self.conn.close()
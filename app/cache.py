@@ -0,0 +1,234 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import orjson
+
+from .metrics import CACHE_REQUESTS
+
+logger = logging.getLogger("app.cache")
+
+PRODUCT_COUNT_TTL = float(os.getenv("PRODUCT_COUNT_TTL", "30"))
+# Read-through cache of products by id and SKU and of list pages; 0 turns it off
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "60"))
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "10000"))
+# Shared cache for several API processes and Celery workers; defaults to the Celery broker when USE_CELERY=true
+PRODUCT_CACHE_REDIS_URL = os.getenv("PRODUCT_CACHE_REDIS_URL") or (
+    os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0") if os.getenv("USE_CELERY", "false").lower() == "true" else ""
+)
+
+class TTLCache:
+    # Small thread-safe LRU with per-entry expiry
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class RedisCache:
+    # TTLCache's interface over Redis, shared by every process; values are stored as JSON
+    def __init__(self, url: str, ttl: float, prefix: str):
+        self.url = url
+        self.ttl_ms = max(1, int(ttl * 1000))
+        self.prefix = prefix
+        self._redis = None
+
+    def _client(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(self.url)
+        return self._redis
+
+    def get(self, key):
+        raw = self._client().get(self.prefix + key)
+        return orjson.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        self._client().set(self.prefix + key, orjson.dumps(value), px=self.ttl_ms)
+
+    def set_many_if(self, items: dict, guard: str, expected: int) -> bool:
+        # Writes only while ``guard`` still holds ``expected`` (WATCH/MULTI), so a value read
+        # before a concurrent write cannot land after that write's invalidation
+        import redis
+        with self._client().pipeline() as pipe:
+            try:
+                pipe.watch(self.prefix + guard)
+                if int(pipe.get(self.prefix + guard) or 0) != expected:
+                    return False
+                pipe.multi()
+                for key, value in items.items():
+                    pipe.set(self.prefix + key, orjson.dumps(value), px=self.ttl_ms)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def delete(self, keys):
+        keys = [self.prefix + k for k in keys]
+        if keys:
+            self._client().delete(*keys)
+
+    def incr(self, key) -> int:
+        return self._client().incr(self.prefix + key)
+
+    def counter(self, key) -> int:
+        return int(self._client().get(self.prefix + key) or 0)
+
+    def clear(self, patterns=("*",)):
+        client = self._client()
+        for pattern in patterns:
+            batch = []
+            for key in client.scan_iter(match=self.prefix + pattern, count=1000):
+                batch.append(key)
+                if len(batch) >= 1000:
+                    client.delete(*batch)
+                    batch = []
+            if batch:
+                client.delete(*batch)
+
+class ProductCache:
+    """Read-through cache for product reads: by id, by sku_lower and whole list pages.
+
+    A SKU entry holds the product as ProductOut data, or ``{}`` when no product has that
+    SKU; an id entry only points at a SKU entry, so dropping a SKU's entry also drops its id
+    lookup. List pages are keyed by a generation number that every product write bumps.
+    Values loaded from the database are stored only if no write happened meanwhile
+    (``generation`` read before the load). Redis errors are logged and count as misses.
+    """
+
+    def __init__(self, ttl: float = PRODUCT_CACHE_TTL, maxsize: int = PRODUCT_CACHE_SIZE, redis_url: str = PRODUCT_CACHE_REDIS_URL):
+        self.enabled = ttl > 0
+        self.redis = RedisCache(redis_url, ttl, "product-cache:") if redis_url else None
+        self.local = TTLCache(ttl, maxsize)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._hits = {c: CACHE_REQUESTS.labels(c, "hit") for c in ("product_id", "product_sku", "product_list")}
+        self._misses = {c: CACHE_REQUESTS.labels(c, "miss") for c in ("product_id", "product_sku", "product_list")}
+
+    def _get(self, key):
+        if self.redis is None:
+            return self.local.get(key)
+        try:
+            return self.redis.get(key)
+        except Exception as e:
+            logger.error(f"Product cache read failed: {e}")
+            return None
+
+    def _count(self, cache: str, value):
+        (self._misses if value is None else self._hits)[cache].inc()
+        return value
+
+    def generation(self) -> int:
+        if self.redis is None:
+            return self._generation
+        try:
+            return self.redis.counter("generation")
+        except Exception as e:
+            logger.error(f"Product cache read failed: {e}")
+            return -1
+
+    def by_sku(self, sku_lower: str) -> dict | None:
+        # None: not cached; {}: cached as "no such product"
+        if not self.enabled:
+            return None
+        return self._count("product_sku", self._get(f"sku:{sku_lower}"))
+
+    def by_id(self, product_id: int) -> dict | None:
+        if not self.enabled:
+            return None
+        sku_lower = self._get(f"id:{product_id}")
+        product = self._get(f"sku:{sku_lower}") if sku_lower is not None else None
+        if not product or product["id"] != product_id:
+            product = None
+        return self._count("product_id", product)
+
+    def put_product(self, sku_lower: str, product: dict | None, generation: int):
+        items = {f"sku:{sku_lower}": product or {}}
+        if product:
+            items[f"id:{product['id']}"] = sku_lower
+        self._put(items, generation)
+
+    def list_page(self, key: str, generation: int) -> dict | None:
+        if not self.enabled or generation < 0:
+            return None
+        return self._count("product_list", self._get(f"list:{generation}:{key}"))
+
+    def put_list_page(self, key: str, page: dict, generation: int):
+        self._put({f"list:{generation}:{key}": page}, generation)
+
+    def _put(self, items: dict, generation: int):
+        if not self.enabled or generation < 0:
+            return
+        if self.redis is None:
+            with self._lock:
+                if self._generation == generation:
+                    for key, value in items.items():
+                        self.local.set(key, value)
+            return
+        try:
+            self.redis.set_many_if(items, "generation", generation)
+        except Exception as e:
+            logger.error(f"Product cache write failed: {e}")
+
+    def invalidate(self, skus=None):
+        # Call after the write committed: bump first, so loads that raced the write are not stored
+        if not self.enabled:
+            return
+        keys = None if skus is None else [f"sku:{s}" for s in skus]
+        if self.redis is None:
+            with self._lock:
+                self._generation += 1
+                if keys is None:
+                    self.local.clear()
+                else:
+                    self.local.delete(keys)
+            return
+        try:
+            self.redis.incr("generation")
+            if keys is None:
+                # The generation counter survives, so pages stored under older numbers stay unreachable
+                self.redis.clear(("sku:*", "id:*", "list:*"))
+            else:
+                self.redis.delete(keys)
+        except Exception as e:
+            logger.error(f"Product cache invalidation failed: {e}")
+
+# Product counts keyed by the list filters. Writers in this process clear it right away;
+# writes from other processes (Celery workers) show up once entries expire.
+product_counts = TTLCache(PRODUCT_COUNT_TTL)
+product_cache = ProductCache()
+
+def invalidate_products(skus=None):
+    # skus: sku_lower values a write touched; None when any product may have changed
+    product_counts.clear()
+    product_cache.invalidate(skus)
@@ -0,0 +1,125 @@
+"""Columnar CSV parsing for imports, backed by pyarrow when it is installed.
+
+Record batches from pyarrow's multithreaded CSV reader are normalized with vectorized string
+kernels and handed to the batch writer as the same dicts ``bulk.normalize_row`` produces.
+Anything the stdlib path would read differently raises one of ``FALLBACK_ERRORS`` (ragged
+rows, invalid UTF-8, records larger than a block, bare carriage returns); callers then re-run
+the file through csv.DictReader, which is safe because upserts are idempotent.
+"""
+import io
+import os
+import logging
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+
+logger = logging.getLogger("app.columnar")
+
+# auto: pyarrow when installed; stdlib: always csv.DictReader; arrow: require pyarrow
+IMPORT_CSV_BACKEND = os.getenv("IMPORT_CSV_BACKEND", "auto").lower()
+ARROW_BLOCK_SIZE = int(os.getenv("ARROW_BLOCK_SIZE", str(4 * 1024 * 1024)))
+
+COLUMNS = ("sku", "name", "description")
+# Exactly what str.strip() removes, so trimmed values match the row-by-row path
+_PY_WHITESPACE = "".join(chr(c) for c in range(0x110000) if chr(c).isspace())
+
+class BareCarriageReturn(ValueError):
+    pass
+
+class _CRGuard(io.RawIOBase):
+    # pyarrow ends records at a lone '\r'; the stdlib reader (fed '\n'-split lines) rejects it
+    # in unquoted fields and keeps it in quoted ones. Either way, leave such files to csv.
+    def __init__(self, f):
+        self.f = f
+        self.pending_cr = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        data = self.f.read(len(b))
+        if not data:
+            # A final '\r' just ends the last line for both readers
+            return 0
+        if self.pending_cr and data[:1] != b"\n":
+            raise BareCarriageReturn("bare carriage return")
+        if b"\r" in data and data.count(b"\r") != data.count(b"\r\n") + data.endswith(b"\r"):
+            raise BareCarriageReturn("bare carriage return")
+        self.pending_cr = data.endswith(b"\r")
+        n = len(data)
+        b[:n] = data
+        return n
+
+FALLBACK_ERRORS = (pa.ArrowInvalid, BareCarriageReturn) if pa is not None else ()
+
+def use_arrow() -> bool:
+    if IMPORT_CSV_BACKEND == "stdlib":
+        return False
+    if pa is None:
+        if IMPORT_CSV_BACKEND == "arrow":
+            logger.warning("IMPORT_CSV_BACKEND=arrow but pyarrow is not installed; using csv.DictReader")
+        return False
+    return True
+
+def supports_header(fieldnames: list[str]) -> bool:
+    # DictReader keeps the last of repeated column names; pyarrow has no equivalent
+    return len(set(fieldnames)) == len(fieldnames)
+
+def open_batches(stream, fieldnames: list[str]):
+    """Stream record batches of the sku/name/description columns from a binary CSV stream.
+
+    Every column is read as a string (no type inference) and empty fields stay "".
+    """
+    present = [c for c in COLUMNS if c in fieldnames]
+    return pacsv.open_csv(
+        io.BufferedReader(_CRGuard(stream), 1 << 20),
+        read_options=pacsv.ReadOptions(block_size=ARROW_BLOCK_SIZE),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=present,
+            column_types={c: pa.string() for c in present},
+            strings_can_be_null=False,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+
+def _column(batch, name: str):
+    i = batch.schema.get_field_index(name)
+    if i == -1:
+        return pa.array([""] * batch.num_rows, pa.string())
+    return batch.column(i)
+
+def _strip(arr):
+    return pc.utf8_trim(arr, characters=_PY_WHITESPACE)
+
+def _lower(arr):
+    # ascii_lower is exact for ASCII; str.lower() has special cases (e.g. 'İ') utf8_lower maps differently
+    if pc.all(pc.string_is_ascii(arr)).as_py() is not False:
+        return pc.ascii_lower(arr)
+    return pa.array([s.lower() for s in arr.to_pylist()], pa.string())
+
+def normalize_batch(batch) -> tuple[list[dict], list[int] | None]:
+    """Vectorized bulk.normalize_row over one record batch; rows without a SKU are dropped.
+
+    Returns the items and, when rows were dropped, each item's row index in the batch
+    (None means item i is row i).
+    """
+    sku = _strip(_column(batch, "sku"))
+    name = _column(batch, "name")
+    # (name or sku).strip(): an empty name falls back to the already stripped SKU
+    name = pc.if_else(pc.equal(name, ""), sku, _strip(name))
+    description = _strip(_column(batch, "description"))
+    keep = pc.not_equal(sku, "")
+    positions = None
+    if not pc.all(keep).as_py():
+        positions = pc.indices_nonzero(keep).to_pylist()
+        sku, name, description = pc.filter(sku, keep), pc.filter(name, keep), pc.filter(description, keep)
+    items = [
+        {"sku": s, "sku_lower": lo, "name": n, "description": d}
+        for s, lo, n, d in zip(sku.to_pylist(), _lower(sku).to_pylist(), name.to_pylist(), description.to_pylist())
+    ]
+    return items, positions
@@ -0,0 +1,180 @@
+import bz2
+import csv
+import gzip
+import io
+import os
+import queue
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_MAGIC = (
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+)
+
+class CountingReader(io.RawIOBase):
+    # Counts bytes pulled from the wrapped binary stream (compressed bytes, under a decompressor)
+    def __init__(self, f):
+        self.f = f
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        n = self.f.readinto(b) or 0
+        self.count += n
+        return n
+
+def detect_codec(head: bytes) -> str | None:
+    for magic, codec in _MAGIC:
+        if head.startswith(magic):
+            return codec
+    return None
+
+def sniff_codec(path: str) -> str | None:
+    with open(path, "rb") as f:
+        return detect_codec(f.read(4))
+
+def open_csv_stream(f):
+    """Wrap a buffered binary stream (anything with peek()) so gzip/bz2/zstd input is decompressed on the fly.
+
+    Returns (stream, codec, counter): ``counter`` is a CountingReader over the compressed
+    input (None for plain CSV) so progress can be reported against the uploaded size.
+    """
+    codec = detect_codec(f.peek(4)[:4])
+    if codec is None:
+        return f, None, None
+    counter = CountingReader(f)
+    buffered = io.BufferedReader(counter, 1 << 16)
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=buffered, mode="rb"), codec, counter
+    if codec == "bz2":
+        return bz2.BZ2File(buffered, mode="rb"), codec, counter
+    if zstandard is None:
+        raise ValueError("zstd-compressed CSV requires the 'zstandard' package")
+    reader = zstandard.ZstdDecompressor().stream_reader(buffered, read_across_frames=True)
+    return io.BufferedReader(reader, 1 << 16), codec, counter
+
+class ByteLines:
+    # Iterates a binary file as decoded lines for csv.reader while counting bytes consumed.
+    # With a limit, stops at the first line boundary at or past that many bytes. For
+    # compressed input ``counter`` tracks the compressed bytes behind ``progress``. ``start``
+    # is where ``f`` is positioned (a resumed import); ``consumed`` counts from there.
+    def __init__(self, f, limit: int | None = None, counter: CountingReader | None = None, start: int = 0):
+        self.f = f
+        self.limit = limit
+        self.counter = counter
+        self.start = start
+        self.consumed = start
+
+    @property
+    def progress(self) -> int:
+        return self.counter.count if self.counter is not None else self.consumed
+
+    def __iter__(self):
+        for line in self.f:
+            self.consumed += len(line)
+            yield line.decode("utf-8")
+            if self.limit is not None and self.consumed - self.start >= self.limit:
+                return
+
+def csv_lines(f) -> ByteLines:
+    stream, _, counter = open_csv_stream(f)
+    return ByteLines(stream, counter=counter)
+
+def skip_bytes(stream, n: int):
+    # Reads past the first ``n`` bytes; the only way to reach a position inside compressed data
+    while n > 0:
+        data = stream.read(min(n, 1 << 20))
+        if not data:
+            raise ValueError("File is shorter than the job's checkpoint")
+        n -= len(data)
+
+def read_header(path: str) -> tuple[list[str], int]:
+    # Returns the header fields and the byte offset where the first record starts
+    with open(path, "rb") as f:
+        lines = ByteLines(f)
+        fieldnames = next(csv.reader(lines), [])
+        return fieldnames, lines.consumed
+
+def split_ranges(path: str, start: int, parts: int) -> list[tuple[int, int]]:
+    """Split ``path`` from byte ``start`` to EOF into about ``parts`` ranges ending on record boundaries.
+
+    Boundaries come from a csv.reader pass over the file, so they fall exactly where the
+    serial import's records end: quoted newlines never split a record, and a stray '"' in an
+    unquoted field (``5" screen``) cannot throw the quote tracking off.
+    """
+    size = os.path.getsize(path)
+    if parts <= 1 or size <= start:
+        return [(start, size)]
+    step = (size - start) // parts
+    bounds = [start]
+    with open(path, "rb") as f:
+        f.seek(start)
+        lines = ByteLines(f, start=start)
+        for _ in csv.reader(lines):
+            if len(bounds) == parts or lines.consumed >= size:
+                break
+            if lines.consumed >= start + step * len(bounds):
+                bounds.append(lines.consumed)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+class ChunkPipe(io.RawIOBase):
+    """Blocking byte pipe from an upload handler to an importer thread.
+
+    The producer calls ``put`` with body chunks and ``close_writer`` (optionally with an
+    error) at the end; the importer reads it like a file. At most ``max_chunks`` chunks are
+    buffered, so a slow importer applies backpressure to the upload instead of growing memory.
+    """
+
+    def __init__(self, max_chunks: int = 16):
+        self._queue: queue.Queue = queue.Queue(maxsize=max_chunks)
+        self._chunk = b""
+        self._pos = 0
+        self._eof = False
+        self._reader_done = threading.Event()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        while self._pos >= len(self._chunk):
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if item is None:
+                self._eof = True
+                return 0
+            if isinstance(item, BaseException):
+                self._eof = True
+                raise item
+            self._chunk, self._pos = item, 0
+        n = min(len(b), len(self._chunk) - self._pos)
+        b[:n] = self._chunk[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def close(self):
+        # Reader side is finished (or gave up); unblock a producer waiting on a full queue
+        self._reader_done.set()
+        super().close()
+
+    def put(self, item) -> bool:
+        # Returns False once the reader has stopped consuming
+        while not self._reader_done.is_set():
+            try:
+                self._queue.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close_writer(self, error: BaseException | None = None):
+        self.put(error)
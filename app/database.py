@@ -1,8 +1,14 @@
 import os
+import time
 import logging
-from sqlalchemy import create_engine, event
+import itertools
+from sqlalchemy import create_engine, event, inspect, literal
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
+from .metrics import DB_COMMITS, DB_READ_SESSIONS, statement_timer
+
 _env_db = os.getenv("DATABASE_URL")
 if _env_db:
     DATABASE_URL = _env_db
@@ -15,18 +21,106 @@ else:
         DATABASE_URL = f"sqlite:///{_default_sqlite}"
     except Exception:
         DATABASE_URL = "sqlite:////tmp/data.db"
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+psycopg2://", 1)
+
+def _normalize_url(url: str) -> str:
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+psycopg2://", 1)
+    return url
+
+DATABASE_URL = _normalize_url(DATABASE_URL)
+
+def _async_url(url: str) -> str:
+    # Same database through an asyncio driver: aiosqlite for SQLite, asyncpg for PostgreSQL
+    u = make_url(url)
+    if u.get_backend_name() == "sqlite":
+        return u.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    if u.get_backend_name() == "postgresql":
+        query = dict(u.query)
+        if "sslmode" in query:
+            # asyncpg spells libpq's sslmode as ssl
+            query["ssl"] = query.pop("sslmode")
+        return u.set(drivername="postgresql+asyncpg", query=query).render_as_string(hide_password=False)
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+# Connections per engine (sync and async each have a pool) for PostgreSQL
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Read replicas for GET routes, comma-separated; unset, they read from the primary
+DATABASE_READ_URLS = [_normalize_url(u.strip()) for u in os.getenv("DATABASE_READ_URL", "").split(",") if u.strip()]
+# Pool per replica engine
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", str(DB_POOL_SIZE)))
+DB_READ_MAX_OVERFLOW = int(os.getenv("DB_READ_MAX_OVERFLOW", str(DB_MAX_OVERFLOW)))
+# Seconds a replica that refused a connection is skipped before it is tried again
+DB_READ_RETRY_SECS = float(os.getenv("DB_READ_RETRY_SECS", "30"))
 
 # SQLite needs check_same_thread=False for FastAPI
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},
-    pool_pre_ping=True,
-    pool_size=5 if DATABASE_URL.startswith("postgresql") else None,
-    max_overflow=10 if DATABASE_URL.startswith("postgresql") else None,
-)
+def _engine_kwargs(url: str, pool_size: int, max_overflow: int, sync: bool) -> dict:
+    kwargs = {"pool_pre_ping": True}
+    if url.startswith("sqlite"):
+        # Parallel import chunks write through separate connections; wait on the file lock instead of failing
+        kwargs["connect_args"] = {"check_same_thread": False, "timeout": 30} if sync else {"timeout": 30}
+    elif url.startswith("postgresql"):
+        kwargs.update(pool_size=pool_size, max_overflow=max_overflow)
+    return kwargs
+
+engine = create_engine(DATABASE_URL, **_engine_kwargs(DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, sync=True))
+# API routes run on the event loop through this engine; imports and workers use the sync one
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_kwargs(DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, sync=False))
+read_engines = [
+    create_async_engine(_async_url(url), **_engine_kwargs(url, DB_READ_POOL_SIZE, DB_READ_MAX_OVERFLOW, sync=False))
+    for url in DATABASE_READ_URLS
+]
+# Same replicas for sync readers (streamed exports); index k is the same replica as read_engines[k]
+read_sync_engines = [
+    create_engine(url, **_engine_kwargs(url, DB_READ_POOL_SIZE, DB_READ_MAX_OVERFLOW, sync=True))
+    for url in DATABASE_READ_URLS
+]
+
+def _instrument(engine):
+    # Statement latency and commit counts for /metrics; executemany counts as one statement
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        statement_timer(statement).observe(time.perf_counter() - conn.info["query_start"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _execute_failed(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    @event.listens_for(engine, "commit")
+    def _on_commit(conn):
+        DB_COMMITS.inc()
+
+_instrument(engine)
+_instrument(async_engine.sync_engine)
+for _read_engine in read_engines:
+    _instrument(_read_engine.sync_engine)
+for _read_engine in read_sync_engines:
+    _instrument(_read_engine)
+
+def _query_only(dbapi_conn, record):
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA query_only = ON")
+    cursor.close()
+
+for _read_engine in (*(e.sync_engine for e in read_engines), *read_sync_engines):
+    if _read_engine.dialect.name == "sqlite":
+        event.listen(_read_engine, "connect", _query_only)
+
+# SQLite: send this process's writes through one writer thread (app.writer) instead of racing for the file lock
+SQLITE_WRITER = DATABASE_URL.startswith("sqlite") and os.getenv("SQLITE_WRITER", "true").lower() == "true"
+if SQLITE_WRITER:
+    # API routes only read through the async pool; a write that bypasses the writer fails loudly
+    event.listen(async_engine.sync_engine, "connect", _query_only)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 class Base(DeclarativeBase):
     pass
@@ -47,11 +141,127 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            try:
+                await db.rollback()
+            except Exception:
+                pass
+            logging.getLogger("app.database").error(str(e))
+            raise
+
+_read_down_until = [0.0] * len(read_engines)
+_read_turn = itertools.count()
+
+def _replicas():
+    # Replica indexes in turn, skipping those that recently refused a connection
+    for _ in range(len(read_engines)):
+        k = next(_read_turn) % len(read_engines)
+        if _read_down_until[k] <= time.monotonic():
+            yield k
+
+def _replica_down(k: int, e: Exception):
+    _read_down_until[k] = time.monotonic() + DB_READ_RETRY_SECS
+    logging.getLogger("app.database").warning(
+        "Read replica %s unavailable for %ss: %s", read_engines[k].url.render_as_string(hide_password=True), DB_READ_RETRY_SECS, e
+    )
+
+async def read_session():
+    # The next replica in turn that accepts a connection, else the primary
+    for k in _replicas():
+        db = AsyncSessionLocal(bind=read_engines[k])
+        try:
+            await db.connection()
+        except Exception as e:
+            await db.close()
+            _replica_down(k, e)
+            continue
+        DB_READ_SESSIONS.labels("replica").inc()
+        return db
+    DB_READ_SESSIONS.labels("primary").inc()
+    return AsyncSessionLocal()
+
+def sync_read_session():
+    # read_session for sync code: a replica in turn, else the primary
+    for k in _replicas():
+        db = SessionLocal(bind=read_sync_engines[k])
+        try:
+            db.connection()
+        except Exception as e:
+            db.close()
+            _replica_down(k, e)
+            continue
+        DB_READ_SESSIONS.labels("replica").inc()
+        return db
+    DB_READ_SESSIONS.labels("primary").inc()
+    return SessionLocal()
+
+def reads_primary(db) -> bool:
+    # False for a replica session: what it reads may lag the primary, so callers should not cache it
+    return db.bind is async_engine
+
+async def get_read_db():
+    # For GET routes: replicas can lag the primary, so anything that writes or must see its own write uses get_async_db
+    async with await read_session() as db:
+        try:
+            yield db
+        except Exception as e:
+            try:
+                await db.rollback()
+            except Exception:
+                pass
+            logging.getLogger("app.database").error(str(e))
+            raise
+
+def invalidate_statement_caches():
+    # After a table swap in this process: pooled asyncpg connections drop their prepared statements on next use
+    for e in (async_engine, *read_engines):
+        if e.dialect.name == "postgresql":
+            e.dialect._invalidate_schema_cache()
+
+def stale_statement(e: BaseException) -> bool:
+    # asyncpg ran a statement prepared before another process swapped a table; SQLAlchemy has
+    # already cleared that engine's caches, so running the request again succeeds
+    orig = getattr(e, "orig", None)
+    if orig is None or async_engine.dialect.name != "postgresql":
+        return False
+    dbapi = async_engine.dialect.dbapi
+    return isinstance(orig, dbapi.InvalidCachedStatementError) or (
+        isinstance(orig, dbapi.InternalServerError) and "cache lookup failed" in str(orig)
+    )
+
+async def dispose_async_engines():
+    for e in (async_engine, *read_engines):
+        await e.dispose()
+
 # Initialize tables
 
+def _add_missing_columns(conn):
+    # create_all() never alters existing tables; add columns introduced since the table was created
+    insp = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+            if column.default is not None and column.default.is_scalar:
+                ddl += " DEFAULT " + str(literal(column.default.arg).compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+            conn.exec_driver_sql(ddl)
+            logging.getLogger("app.database").info("Added column %s.%s", table.name, column.name)
+
 def init_db():
     from . import models
     Base.metadata.create_all(bind=engine)
+    from .search import init_search
+    with engine.begin() as conn:
+        _add_missing_columns(conn)
+        init_search(conn)
     if DATABASE_URL.startswith("sqlite"):
         with engine.begin() as conn:
             conn.exec_driver_sql("PRAGMA journal_mode=WAL")
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger("app.events")
+
+# Redis pub/sub fans progress out of Celery workers; defaults to the Celery broker when USE_CELERY=true
+EVENTS_REDIS_URL = os.getenv("EVENTS_REDIS_URL") or (
+    os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0") if os.getenv("USE_CELERY", "false").lower() == "true" else ""
+)
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "job-progress")
+# Latest snapshot is kept for this many jobs so late subscribers and Last-Event-ID resumes skip the DB
+EVENTS_CACHE_JOBS = int(os.getenv("EVENTS_CACHE_JOBS", "1000"))
+
+def event_id(payload: dict) -> str:
+    # Content-derived, so every API process assigns the same id to the same snapshot
+    return hashlib.blake2b(json.dumps(payload, sort_keys=True, default=str).encode(), digest_size=8).hexdigest()
+
+class ProgressBroker:
+    """Fans job progress snapshots out to SSE subscribers.
+
+    ``publish`` may be called from any thread (importer threads, the Redis listener);
+    subscribers are asyncio queues drained by the SSE endpoint. Each subscriber queue holds
+    only the newest snapshot, so a slow browser never builds a backlog.
+    """
+
+    def __init__(self, redis_url: str = "", channel: str = EVENTS_CHANNEL):
+        self.redis_url = redis_url
+        self.channel = channel
+        self._lock = threading.Lock()
+        self._subs: dict[str, set] = {}
+        self._latest: OrderedDict[str, tuple[str, dict]] = OrderedDict()
+        self._redis = None
+        self._listener: threading.Thread | None = None
+
+    def publish(self, job_id: str, payload: dict):
+        if self.redis_url:
+            try:
+                self._redis_client().publish(self.channel, json.dumps({"job_id": job_id, "data": payload}, default=str))
+                return
+            except Exception as e:
+                logger.error(f"Redis publish failed, delivering locally: {e}")
+        self._deliver(job_id, payload)
+
+    def latest(self, job_id: str) -> tuple[str, dict] | None:
+        with self._lock:
+            return self._latest.get(job_id)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        self._ensure_listener()
+        q: asyncio.Queue = asyncio.Queue(maxsize=1)
+        with self._lock:
+            self._subs.setdefault(job_id, set()).add((asyncio.get_running_loop(), q))
+        return q
+
+    def unsubscribe(self, job_id: str, q: asyncio.Queue):
+        with self._lock:
+            subs = self._subs.get(job_id)
+            if subs:
+                subs.difference_update({s for s in subs if s[1] is q})
+                if not subs:
+                    del self._subs[job_id]
+
+    def _deliver(self, job_id: str, payload: dict):
+        item = (event_id(payload), payload)
+        with self._lock:
+            self._latest[job_id] = item
+            self._latest.move_to_end(job_id)
+            while len(self._latest) > EVENTS_CACHE_JOBS:
+                self._latest.popitem(last=False)
+            subs = list(self._subs.get(job_id, ()))
+        for loop, q in subs:
+            try:
+                loop.call_soon_threadsafe(_offer, q, item)
+            except RuntimeError:
+                # subscriber's event loop is gone
+                pass
+
+    def _redis_client(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(self.redis_url)
+        return self._redis
+
+    def _ensure_listener(self):
+        if not self.redis_url or self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="progress-listener", daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    msg = json.loads(message["data"])
+                    self._deliver(msg["job_id"], msg["data"])
+            except Exception as e:
+                logger.error(f"Progress listener error: {e}")
+                time.sleep(1)
+
+def _offer(q: asyncio.Queue, item):
+    # Keep only the newest snapshot
+    if q.full():
+        try:
+            q.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+    q.put_nowait(item)
+
+broker = ProgressBroker(EVENTS_REDIS_URL)
@@ -1,30 +1,99 @@
+import io
+import csv
+import zlib
 import os
+import base64
 import shutil
 import uuid
+import asyncio
 import logging
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks, Depends, HTTPException, Query
-from fastapi.responses import HTMLResponse, StreamingResponse
+import aiofiles
+import orjson
+from collections import Counter
+from concurrent.futures import Future
+from fastapi import FastAPI, UploadFile, File, BackgroundTasks, Depends, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, StreamingResponse, Response, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy import text, select, delete, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import Generator
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
 
-from .database import get_db, init_db
+from .database import get_db, get_async_db, get_read_db, read_session, sync_read_session, reads_primary, stale_statement, init_db, SessionLocal, AsyncSessionLocal, dispose_async_engines
+from .writer import writer, write, awrite
+from .csvio import ChunkPipe
+from .bulk import normalize_row, upsert_products, product_ids, delete_products
+from .events import broker, event_id
+from .cache import product_counts, product_cache, invalidate_products
+from .search import apply_text_search, relevance_order
 from . import models
 from . import tasks
-from .schemas import ProductCreate, ProductUpdate, ProductOut, PaginatedProducts, WebhookCreate, WebhookUpdate, WebhookOut, JobStatus
-from .webhooks import test_webhook
+from .schemas import ProductCreate, ProductUpdate, ProductOut, PaginatedProducts, WebhookCreate, WebhookUpdate, WebhookOut, WebhookDeliveryOut, JobStatus
+from .webhooks import test_webhook, deliveries, resume_pending
+from .metrics import MetricsMiddleware, render as render_metrics
+from .scheduler import JobScheduler, QueueFull, IMPORT_CONCURRENCY, IMPORT_QUEUE_DEPTH
 
 APP_DIR = os.path.dirname(__file__)
 UPLOAD_DIR = os.path.join(APP_DIR, "uploads")
+SSE_HEARTBEAT_SECS = float(os.getenv("SSE_HEARTBEAT_SECS", "15"))
+# Rows fetched per round trip (server-side cursor on PostgreSQL) and written per chunk by /products/export
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+class StaleStatementRetry:
+    # Runs a GET again when it failed on a statement prepared before another process swapped the
+    # products table (replace import); keeping asyncpg's statement caches is worth one retry
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+        started = False
+
+        async def send_wrapper(message):
+            nonlocal started
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            if started or not stale_statement(e):
+                raise
+            logging.getLogger("app.main").info("Retrying %s after a stale prepared statement", scope["path"])
+            await self.app(scope, receive, send)
+
 app = FastAPI(title="Acme Product Importer")
+app.add_middleware(StaleStatementRetry)
+app.add_middleware(MetricsMiddleware)
 app.mount("/static", StaticFiles(directory=os.path.join(APP_DIR, "static")), name="static")
 
+# In-process imports (USE_CELERY=false) run here so /upload returns as soon as the job is queued
+scheduler = JobScheduler(
+    IMPORT_CONCURRENCY,
+    IMPORT_QUEUE_DEPTH,
+    on_abandon=lambda job_id: tasks.fail_job(job_id, "Server shut down before the import started"),
+)
+
 # Initialize DB on startup
 @app.on_event("startup")
 def on_startup():
     init_db()
+    resumed = resume_pending()
+    if resumed:
+        logging.getLogger("app.main").info("Re-sending %s webhook deliveries left pending by a previous run", resumed)
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await run_in_threadpool(scheduler.shutdown)
+    await run_in_threadpool(deliveries.shutdown)
+    if writer is not None:
+        await run_in_threadpool(writer.shutdown)
+    await dispose_async_engines()
 
 @app.get("/", response_class=HTMLResponse)
 def index():
@@ -32,35 +101,222 @@ def index():
     with open(index_path, "r", encoding="utf-8") as f:
         return f.read()
 
+@app.get("/metrics")
+def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
 # --------------------- Product CRUD ---------------------
+def _encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps({"id": last_id})).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        return int(orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def _cache(fn, *args):
+    # In-process the product cache is a locked dict; shared through Redis every call blocks on a round trip
+    if product_cache.redis is None:
+        return fn(*args)
+    return await run_in_threadpool(fn, *args)
+
+async def _count_products(db: AsyncSession, q, key: tuple, mode: str) -> tuple[int | None, bool]:
+    # Returns (total, estimated)
+    if mode == "none":
+        return None, False
+    count_q = select(func.count()).select_from(q.subquery())
+    if mode == "exact":
+        return await db.scalar(count_q), False
+    if mode == "approx" and key == (None, None, None, None) and db.bind.dialect.name == "postgresql":
+        # Planner statistics: no scan, refreshed by autovacuum/ANALYZE
+        est = await db.scalar(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'products'::regclass"))
+        if est is not None and est >= 0:
+            return int(est), True
+    total = product_counts.get(key)
+    if total is None:
+        total = await db.scalar(count_q)
+        product_counts.set(key, total)
+        return total, False
+    return total, True
+
+# Columns of ProductOut / WebhookOut: list routes select just these and serialize the rows with orjson,
+# skipping a model per item and FastAPI's response_model pass (response_model stays for the docs)
+PRODUCT_OUT_COLUMNS = tuple(getattr(models.Product, f) for f in ProductOut.model_fields)
+WEBHOOK_OUT_COLUMNS = tuple(getattr(models.Webhook, f) for f in WebhookOut.model_fields)
+
 @app.get("/products", response_model=PaginatedProducts)
-def list_products(
-    db: Session = Depends(get_db),
+async def list_products(
+    db: AsyncSession = Depends(get_read_db),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     sku: str | None = None,
     name: str | None = None,
     description: str | None = None,
     active: bool | None = None,
+    after_id: int | None = Query(None, ge=1),
+    cursor: str | None = None,
+    count: str = Query("exact", pattern="^(exact|cached|approx|none)$"),
+    sort: str = Query("id", pattern="^(id|relevance)$"),
 ):
-    q = db.query(models.Product)
+    ranked = sort == "relevance" and bool(name or description)
+    if ranked and (cursor or after_id):
+        raise HTTPException(status_code=400, detail="Cursor paging is only available with sort=id")
+    if sku and not (name or description or cursor or after_id):
+        # SKU lookups (storefront sync) match at most one product: served from the SKU cache
+        p = await _product_by_sku(db, sku.lower())
+        matches = [p] if p and (active is None or p["active"] == active) else []
+        items = matches if page == 1 else []
+        return ORJSONResponse({
+            "total": None if count == "none" else len(matches),
+            "total_estimated": False,
+            "page": page,
+            "page_size": page_size,
+            "items": items,
+            "next_cursor": _encode_cursor(items[-1]["id"]) if len(items) == page_size else None,
+        })
+    generation = await _cache(product_cache.generation)
+    page_key = orjson.dumps([page, page_size, sku and sku.lower(), name, description, active, after_id, cursor, count, sort]).decode()
+    cached = await _cache(product_cache.list_page, page_key, generation)
+    if cached is not None:
+        return ORJSONResponse(cached)
+    q = select(*PRODUCT_OUT_COLUMNS)
     if sku:
         q = q.filter(models.Product.sku_lower == sku.lower())
-    if name:
-        q = q.filter(models.Product.name.ilike(f"%{name}%"))
-    if description:
-        q = q.filter(models.Product.description.ilike(f"%{description}%"))
+    q = apply_text_search(q, name, description)
     if active is not None:
         q = q.filter(models.Product.active == active)
-    total = q.count()
-    items = q.order_by(models.Product.id.desc()).offset((page - 1) * page_size).limit(page_size).all()
-    return PaginatedProducts(total=total, page=page, page_size=page_size, items=[ProductOut.model_validate(i) for i in items])
+    total, estimated = await _count_products(db, q, (sku.lower() if sku else None, name, description, active), count)
+    if cursor:
+        after_id = _decode_cursor(cursor)
+    if ranked:
+        q = q.order_by(*relevance_order(name, description))
+    q = q.order_by(models.Product.id.desc())
+    if after_id is not None:
+        # Keyset page: walks the primary key index instead of skipping OFFSET rows
+        rows = await db.execute(q.filter(models.Product.id < after_id).limit(page_size))
+    else:
+        rows = await db.execute(q.offset((page - 1) * page_size).limit(page_size))
+    items = [dict(r) for r in rows.mappings()]
+    result = {
+        "total": total,
+        "total_estimated": estimated,
+        "page": page,
+        "page_size": page_size,
+        "items": items,
+        # Ranked pages are not in id order, so a keyset cursor cannot continue them
+        "next_cursor": _encode_cursor(items[-1]["id"]) if len(items) == page_size and not ranked else None,
+    }
+    if reads_primary(db):
+        await _cache(product_cache.put_list_page, page_key, result, generation)
+    return ORJSONResponse(result)
+
+EXPORT_COLUMNS = ("sku", "name", "description", "active", "id")
+
+def _export_chunks(stmt, fmt: str):
+    # Encoded chunks of EXPORT_BATCH_SIZE rows; the session is our own, as the response outlives get_db's.
+    # Read from a replica: a full export is a long scan the primary's writers should not compete with
+    db = sync_read_session()
+    try:
+        if fmt == "csv":
+            yield (",".join(EXPORT_COLUMNS) + "\n").encode()
+        # Core rows: the ORM result layer would double the cost of building each row
+        for rows in db.connection().execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE)).partitions():
+            if fmt == "csv":
+                buf = io.StringIO()
+                csv.writer(buf, lineterminator="\n").writerows(rows)
+                yield buf.getvalue().encode()
+            else:
+                yield b"".join(orjson.dumps(dict(zip(EXPORT_COLUMNS, r))) + b"\n" for r in rows)
+    finally:
+        db.close()
+
+def _gzip_chunks(chunks):
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = z.compress(chunk)
+        if data:
+            yield data
+    yield z.flush()
+
+@app.get("/products/export")
+def export_products(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    sku: str | None = None,
+    name: str | None = None,
+    description: str | None = None,
+    active: bool | None = None,
+):
+    """Stream matching products in id order as CSV (re-importable with /upload) or NDJSON (accepted by /products/bulk)."""
+    P = models.Product
+    stmt = select(*(getattr(P, c) for c in EXPORT_COLUMNS))
+    if sku:
+        stmt = stmt.filter(P.sku_lower == sku.lower())
+    stmt = apply_text_search(stmt, name, description)
+    if active is not None:
+        stmt = stmt.filter(P.active == active)
+    chunks = _export_chunks(stmt.order_by(P.id), format)
+    filename = f"products.{format}"
+    if gzip:
+        chunks = _gzip_chunks(chunks)
+        filename += ".gz"
+    media_type = "application/gzip" if gzip else ("text/csv" if format == "csv" else "application/x-ndjson")
+    return StreamingResponse(chunks, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# Row writes for write()/awrite(); they run on the writer thread when it is enabled
+def _add_row(db: Session, obj):
+    db.add(obj)
+    db.flush()
+    return obj
+
+def _update_row(db: Session, model, pk, fields: dict):
+    # The updated row, or None if it no longer exists
+    obj = db.get(model, pk)
+    if obj is not None:
+        for k, v in fields.items():
+            setattr(obj, k, v)
+        db.flush()
+    return obj
+
+def _delete_row(db: Session, model, pk) -> bool:
+    obj = db.get(model, pk)
+    if obj is not None:
+        db.delete(obj)
+        db.flush()
+    return obj is not None
+
+async def _product_by_sku(db: AsyncSession, sku_lower: str) -> dict | None:
+    # Read-through: ProductOut data, or None when no product has this SKU
+    cached = await _cache(product_cache.by_sku, sku_lower)
+    if cached is not None:
+        return cached or None
+    generation = await _cache(product_cache.generation)
+    p = await db.scalar(select(models.Product).filter(models.Product.sku_lower == sku_lower))
+    product = ProductOut.model_validate(p).model_dump() if p else None
+    if reads_primary(db):
+        await _cache(product_cache.put_product, sku_lower, product, generation)
+    return product
+
+@app.get("/products/{product_id}", response_model=ProductOut)
+async def get_product(product_id: int, db: AsyncSession = Depends(get_read_db)):
+    cached = await _cache(product_cache.by_id, product_id)
+    if cached is not None:
+        return cached
+    generation = await _cache(product_cache.generation)
+    p = await db.get(models.Product, product_id)
+    if not p:
+        raise HTTPException(status_code=404, detail="Product not found")
+    product = ProductOut.model_validate(p).model_dump()
+    if reads_primary(db):
+        await _cache(product_cache.put_product, p.sku_lower, product, generation)
+    return product
 
 @app.post("/products", response_model=ProductOut)
-def create_product(payload: ProductCreate, db: Session = Depends(get_db)):
+async def create_product(payload: ProductCreate, db: AsyncSession = Depends(get_async_db)):
     sku_lower = payload.sku.lower()
-    existing = db.query(models.Product).filter(models.Product.sku_lower == sku_lower).one_or_none()
-    if existing:
+    if await _product_by_sku(db, sku_lower):
         raise HTTPException(status_code=400, detail="SKU already exists (case-insensitive)")
     p = models.Product(
         sku=payload.sku,
@@ -70,80 +326,245 @@ def create_product(payload: ProductCreate, db: Session = Depends(get_db)):
         active=payload.active if payload.active is not None else True,
     )
     try:
-        db.add(p)
-        db.commit()
-        db.refresh(p)
+        p = await awrite(db, _add_row, p)
+    except IntegrityError:
+        # Created elsewhere after the (possibly cached) existence check
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="SKU already exists (case-insensitive)")
     except Exception as e:
         try:
-            db.rollback()
+            await db.rollback()
         except Exception:
             pass
         logging.getLogger("app.main").error(str(e))
         raise HTTPException(status_code=500, detail="Database error")
+    await _cache(invalidate_products, [sku_lower])
     return ProductOut.model_validate(p)
 
 @app.put("/products/{product_id}", response_model=ProductOut)
-def update_product(product_id: int, payload: ProductUpdate, db: Session = Depends(get_db)):
-    p = db.get(models.Product, product_id)
+async def update_product(product_id: int, payload: ProductUpdate, db: AsyncSession = Depends(get_async_db)):
+    p = await db.get(models.Product, product_id)
     if not p:
         raise HTTPException(status_code=404, detail="Product not found")
+    touched = {p.sku_lower}
+    fields = {}
     if payload.sku and payload.sku.lower() != p.sku_lower:
-        if db.query(models.Product).filter(models.Product.sku_lower == payload.sku.lower()).first():
+        if await _product_by_sku(db, payload.sku.lower()):
             raise HTTPException(status_code=400, detail="SKU already exists (case-insensitive)")
-        p.sku = payload.sku
-        p.sku_lower = payload.sku.lower()
-    if payload.name is not None:
-        p.name = payload.name
-    if payload.description is not None:
-        p.description = payload.description
-    if payload.active is not None:
-        p.active = payload.active
+        touched.add(payload.sku.lower())
+        fields.update(sku=payload.sku, sku_lower=payload.sku.lower())
+    for field in ("name", "description", "active"):
+        if getattr(payload, field) is not None:
+            fields[field] = getattr(payload, field)
     try:
-        db.commit()
-        db.refresh(p)
+        p = await awrite(db, _update_row, models.Product, product_id, fields)
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="SKU already exists (case-insensitive)")
     except Exception as e:
         try:
-            db.rollback()
+            await db.rollback()
         except Exception:
             pass
         logging.getLogger("app.main").error(str(e))
         raise HTTPException(status_code=500, detail="Database error")
+    await _cache(invalidate_products, touched)
+    if p is None:
+        raise HTTPException(status_code=404, detail="Product not found")
     return ProductOut.model_validate(p)
 
 @app.delete("/products/{product_id}")
-def delete_product(product_id: int, db: Session = Depends(get_db)):
-    p = db.get(models.Product, product_id)
+async def delete_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    p = await db.get(models.Product, product_id)
     if not p:
         raise HTTPException(status_code=404, detail="Product not found")
+    sku_lower = p.sku_lower
     try:
-        db.delete(p)
-        db.commit()
+        await awrite(db, _delete_row, models.Product, product_id)
     except Exception as e:
         try:
-            db.rollback()
+            await db.rollback()
         except Exception:
             pass
         logging.getLogger("app.main").error(str(e))
         raise HTTPException(status_code=500, detail="Database error")
+    await _cache(invalidate_products, [sku_lower])
     return {"ok": True}
 
+def _delete_all_products(db: Session):
+    db.execute(delete(models.Product))
+
 @app.delete("/products")
-def delete_all_products(db: Session = Depends(get_db)):
+async def delete_all_products(db: AsyncSession = Depends(get_async_db)):
     try:
-        db.query(models.Product).delete()
-        db.commit()
+        await awrite(db, _delete_all_products)
     except Exception as e:
         try:
-            db.rollback()
+            await db.rollback()
         except Exception:
             pass
         logging.getLogger("app.main").error(str(e))
         raise HTTPException(status_code=500, detail="Database error")
+    await _cache(invalidate_products)
     return {"ok": True}
 
+def _bulk_op(item) -> tuple[str, dict]:
+    # Validates one bulk item; returns (op, normalized row) or raises ValueError
+    if isinstance(item, orjson.JSONDecodeError):
+        raise ValueError("Invalid JSON")
+    if not isinstance(item, dict):
+        raise ValueError("Item must be an object")
+    op = item.get("op", "upsert")
+    if op not in ("upsert", "delete"):
+        raise ValueError("op must be 'upsert' or 'delete'")
+    if not isinstance(item.get("sku"), str) or not item["sku"].strip():
+        raise ValueError("sku is required")
+    for field in ("name", "description"):
+        if item.get(field) is not None and not isinstance(item[field], str):
+            raise ValueError(f"{field} must be a string")
+    return op, normalize_row(item)
+
+def _ndjson_line(line: bytes):
+    try:
+        return orjson.loads(line)
+    except orjson.JSONDecodeError as e:
+        return e
+
+async def _ndjson_items(head: bytes, chunks):
+    # Items as the body arrives: ``head`` is what was already read, ``chunks`` the rest of the stream
+    partial, chunk = b"", head
+    while chunk is not None:
+        *lines, partial = (partial + chunk).split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _ndjson_line(line)
+        chunk = await anext(chunks, None)
+    if partial.strip():
+        yield _ndjson_line(partial)
+
+async def _array_items(items):
+    for item in items:
+        yield item
+
+def _write_bulk(db: Session, upserts, deletes: list[str], outcomes: dict) -> tuple[dict, dict]:
+    upsert_products(db, upserts, outcomes=outcomes)
+    inserted = [k for k, (outcome, _) in outcomes.items() if outcome == "inserted"]
+    ids = product_ids(db, inserted) if inserted else {}
+    deleted = delete_products(db, deletes) if deletes else {}
+    return ids, deleted
+
+def _apply_bulk_batch(db: Session, pending: list[tuple[int, object]]) -> list[dict]:
+    """Apply one batch of bulk items in a single transaction and return their results.
+
+    As in an import, the last item for a SKU wins; earlier ones are reported as superseded.
+    """
+    results = []
+    final: dict[str, tuple[int, str, dict]] = {}
+    for index, item in pending:
+        result = {"index": index}
+        results.append(result)
+        try:
+            op, row = _bulk_op(item)
+        except ValueError as e:
+            result.update(status="error", error=str(e))
+            continue
+        result.update(sku=row["sku"], op=op, status="superseded")
+        final[row["sku_lower"]] = (len(results) - 1, op, row)
+    upserts = {k: row for k, (_, op, row) in final.items() if op == "upsert"}
+    deletes = [k for k, (_, op, _) in final.items() if op == "delete"]
+    try:
+        outcomes: dict[str, tuple[str, int | None]] = {}
+        ids, deleted = write(db, _write_bulk, upserts.values(), deletes, outcomes)
+    except Exception as e:
+        try:
+            db.rollback()
+        except Exception:
+            pass
+        logging.getLogger("app.main").error(str(e))
+        for pos, _, _ in final.values():
+            results[pos].update(status="error", error="Database error")
+        return results
+    if final:
+        invalidate_products(final.keys())
+    for k, (pos, op, _) in final.items():
+        if op == "upsert":
+            outcome, product_id = outcomes[k]
+            results[pos].update(status=outcome, id=product_id or ids.get(k))
+        elif k in deleted:
+            results[pos].update(status="deleted", id=deleted[k])
+        else:
+            results[pos]["status"] = "not_found"
+    return results
+
+class _RequestStreamingResponse(StreamingResponse):
+    # For a body iterator that is still reading the request: StreamingResponse's disconnect
+    # listener would take request body chunks off receive() too. A disconnect surfaces as
+    # ClientDisconnect from request.stream() instead.
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+async def _bulk_results(items):
+    # NDJSON results, one line per item, written after each batch commits; a final line has the totals
+    counts = Counter()
+    db = SessionLocal()
+    try:
+        pending = []
+        index = 0
+        async for item in items:
+            pending.append((index, item))
+            index += 1
+            if len(pending) < tasks.BATCH_SIZE:
+                continue
+            results = await run_in_threadpool(_apply_bulk_batch, db, pending)
+            pending = []
+            counts.update(r["status"] for r in results)
+            yield b"".join(orjson.dumps(r) + b"\n" for r in results)
+        if pending:
+            results = await run_in_threadpool(_apply_bulk_batch, db, pending)
+            counts.update(r["status"] for r in results)
+            yield b"".join(orjson.dumps(r) + b"\n" for r in results)
+        yield orjson.dumps({"done": True, "counts": counts}) + b"\n"
+    except ClientDisconnect:
+        # Batches already committed stay; the unfinished one is dropped
+        logging.getLogger("app.main").warning("Bulk request disconnected after %s items", index)
+    finally:
+        db.close()
+
+@app.post("/products/bulk")
+async def bulk_products(request: Request):
+    # Body: a JSON array or NDJSON of {"op": "upsert"|"delete", "sku", "name", "description"}
+    chunks = request.stream()
+    head = b""
+    async for chunk in chunks:
+        head += chunk
+        if head.strip():
+            break
+    if head.lstrip()[:1] == b"[":
+        # An array only parses whole; NDJSON is applied batch by batch while the body arrives
+        body = head + b"".join([chunk async for chunk in chunks])
+        try:
+            items = _array_items(orjson.loads(body))
+        except orjson.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid JSON array")
+        return StreamingResponse(_bulk_results(items), media_type="application/x-ndjson")
+    return _RequestStreamingResponse(_bulk_results(_ndjson_items(head, chunks)), media_type="application/x-ndjson")
+
 # --------------------- Upload & Progress ---------------------
+def _dispatch_import(job_id: str, csv_path: str, mode: str | None):
+    # Background import (Celery-aware, with local fallback); raises QueueFull when the local queue is full
+    use_celery = os.getenv("USE_CELERY", "false").lower() == "true"
+    if use_celery:
+        from .tasks import import_csv_task
+        import_csv_task.delay(job_id, csv_path, mode)
+    else:
+        scheduler.submit(job_id, tasks.import_csv_background, job_id, csv_path, mode)
+
 @app.post("/upload", response_model=JobStatus)
-def upload_csv(file: UploadFile = File(...), db: Session = Depends(get_db)):
+def upload_csv(file: UploadFile = File(...), mode: str | None = Query(None), db: Session = Depends(get_db)):
+    if mode is not None and mode.lower() not in tasks.IMPORT_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(tasks.IMPORT_MODES)}")
     # Save uploaded file to disk
     job_id = str(uuid.uuid4())
     dest_path = os.path.join(UPLOAD_DIR, f"{job_id}.csv")
@@ -156,8 +577,7 @@ def upload_csv(file: UploadFile = File(...), db: Session = Depends(get_db)):
     # Create job
     job = models.JobProgress(id=job_id, stage="queued", status="queued", processed_rows=0, total_rows=0)
     try:
-        db.add(job)
-        db.commit()
+        write(db, _add_row, job)
     except Exception as e:
         try:
             db.rollback()
@@ -165,66 +585,201 @@ def upload_csv(file: UploadFile = File(...), db: Session = Depends(get_db)):
             pass
         logging.getLogger("app.main").error(str(e))
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    # Dispatch background import (Celery-aware, with local fallback)
-    use_celery = os.getenv("USE_CELERY", "false").lower() == "true"
-    if use_celery:
-        from .tasks import import_csv_task
-        import_csv_task.delay(job_id, dest_path)
-    else:
-        tasks.import_csv_background(job_id, dest_path)
+    try:
+        _dispatch_import(job_id, dest_path, mode)
+    except QueueFull as e:
+        try:
+            write(db, _delete_row, models.JobProgress, job_id)
+        except Exception:
+            db.rollback()
+        try:
+            os.remove(dest_path)
+        except OSError:
+            pass
+        raise HTTPException(status_code=429, detail=str(e))
     return JobStatus(id=job_id, stage=job.stage, status=job.status, processed_rows=job.processed_rows, total_rows=job.total_rows, error_message=None)
 
+def _create_job(job_id: str):
+    db = SessionLocal()
+    try:
+        write(db, _add_row, models.JobProgress(id=job_id, stage="queued", status="queued", processed_rows=0, total_rows=0))
+    except Exception as e:
+        try:
+            db.rollback()
+        except Exception:
+            pass
+        logging.getLogger("app.main").error(str(e))
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        db.close()
+
+async def _load_job_status(job_id: str, replica: bool = False) -> JobStatus | None:
+    async with await read_session() if replica else AsyncSessionLocal() as db:
+        job = await db.get(models.JobProgress, job_id)
+        return JobStatus.model_validate(job) if job else None
+
+def _start_stream_import(job_id: str, pipe: ChunkPipe, total_bytes: int) -> Future:
+    # Takes a scheduler slot like any import; until a worker picks it up, the body waits in the pipe
+    _create_job(job_id)
+    importer: Future = Future()
+
+    def run():
+        if not importer.set_running_or_notify_cancel():
+            return
+        try:
+            importer.set_result(tasks.import_csv_stream(job_id, io.BufferedReader(pipe, 1 << 16), total_bytes))
+        except Exception as e:
+            importer.set_exception(e)
+
+    try:
+        scheduler.submit(job_id, run)
+    except QueueFull:
+        db = SessionLocal()
+        try:
+            write(db, _delete_row, models.JobProgress, job_id)
+        except Exception:
+            db.rollback()
+        finally:
+            db.close()
+        raise
+    return importer
+
+@app.post("/upload/stream", response_model=JobStatus)
+async def upload_csv_stream(request: Request, tee: bool = Query(False)):
+    # Raw CSV request body, imported while it arrives; tee=true also keeps a copy under UPLOAD_DIR
+    job_id = str(uuid.uuid4())
+    pipe = ChunkPipe()
+    total_bytes = int(request.headers.get("content-length") or 0)
+    try:
+        importer = await run_in_threadpool(_start_stream_import, job_id, pipe, total_bytes)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    # Once the importer stops (done or failed) any further body is dropped instead of blocking
+    importer.add_done_callback(lambda _: pipe.close())
+    out = await aiofiles.open(os.path.join(UPLOAD_DIR, f"{job_id}.csv"), "wb") if tee else None
+    try:
+        async for chunk in request.stream():
+            if not chunk:
+                continue
+            if out:
+                await out.write(chunk)
+            if not await run_in_threadpool(pipe.put, chunk):
+                break
+        await run_in_threadpool(pipe.close_writer)
+    except Exception as e:
+        logging.getLogger("app.main").error(f"Upload {job_id} interrupted: {e}")
+        await run_in_threadpool(pipe.close_writer, ConnectionError("Upload interrupted"))
+    finally:
+        if out:
+            await out.close()
+    await asyncio.wrap_future(importer)
+    return await _load_job_status(job_id)
+
 @app.get("/jobs/{job_id}", response_model=JobStatus)
-def get_job_status(job_id: str, db: Session = Depends(get_db)):
-    job = db.get(models.JobProgress, job_id)
+async def get_job_status(job_id: str, db: AsyncSession = Depends(get_read_db)):
+    job = await db.get(models.JobProgress, job_id)
+    if job:
+        return JobStatus.model_validate(job)
+    # A job created moments ago may not have reached the replica yet
+    job = await _load_job_status(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/jobs/{job_id}/resume", response_model=JobStatus)
+async def resume_job(job_id: str, mode: str | None = Query(None), force: bool = Query(False), db: AsyncSession = Depends(get_async_db)):
+    # Re-runs a failed import from its last committed batch; force=true also takes over a job
+    # left queued/running by a process that died
+    if mode is not None and mode.lower() not in tasks.IMPORT_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(tasks.IMPORT_MODES)}")
+    job = await db.get(models.JobProgress, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    return JobStatus(id=job.id, stage=job.stage, status=job.status, processed_rows=job.processed_rows, total_rows=job.total_rows, error_message=job.error_message)
+    if job.status == "completed":
+        raise HTTPException(status_code=409, detail="Job already completed")
+    if job.status != "failed" and not force:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}; pass force=true if its importer is gone")
+    csv_path = os.path.join(UPLOAD_DIR, f"{job_id}.csv")
+    if not os.path.exists(csv_path):
+        raise HTTPException(status_code=409, detail="The uploaded file for this job is no longer available")
+    if job.total_bytes and os.path.getsize(csv_path) < job.total_bytes:
+        raise HTTPException(status_code=409, detail="The uploaded file for this job is incomplete")
+    try:
+        status = await awrite(db, tasks._set_job, job_id, {"stage": "queued", "status": "queued", "error_message": None, "finished_at": None})
+    except Exception as e:
+        try:
+            await db.rollback()
+        except Exception:
+            pass
+        logging.getLogger("app.main").error(str(e))
+        raise HTTPException(status_code=500, detail="Database error")
+    # SSE subscribers would otherwise still hold the failed snapshot
+    await run_in_threadpool(broker.publish, job_id, status)
+    try:
+        # Celery's delay() talks to the broker synchronously
+        await run_in_threadpool(_dispatch_import, job_id, csv_path, mode)
+    except QueueFull as e:
+        await run_in_threadpool(tasks.fail_job, job_id, str(e))
+        raise HTTPException(status_code=429, detail=str(e))
+    return status
 
 @app.get("/jobs/{job_id}/events")
-def stream_job_events(job_id: str, db: Session = Depends(get_db)):
-    def event_gen() -> Generator[bytes, None, None]:
-        import time
-        last = None
-        while True:
-            job = db.get(models.JobProgress, job_id)
-            if job:
-                try:
-                    db.refresh(job)
-                except Exception:
-                    pass
-            if not job:
+async def stream_job_events(job_id: str, request: Request):
+    # Push-based: snapshots arrive from the progress broker; the DB is read on connect and on heartbeats only
+    last_event_id = request.headers.get("last-event-id")
+
+    def frame(item) -> bytes:
+        eid, data = item
+        return f"id: {eid}\ndata: {orjson.dumps(data).decode()}\n\n".encode()
+
+    async def db_snapshot(replica: bool = False):
+        job = await _load_job_status(job_id, replica)
+        return None if job is None else (event_id(job.model_dump()), job.model_dump())
+
+    async def event_gen():
+        nonlocal last_event_id
+        q = broker.subscribe(job_id)
+        try:
+            item = broker.latest(job_id) or await db_snapshot()
+            if item is None:
                 yield f"data: {JobStatus(id=job_id, stage='unknown', status='unknown', processed_rows=0, total_rows=0).model_dump_json()}\n\n".encode()
-                break
-            payload = JobStatus(id=job.id, stage=job.stage, status=job.status, processed_rows=job.processed_rows, total_rows=job.total_rows, error_message=job.error_message).model_dump_json()
-            if payload != last:
-                yield f"data: {payload}\n\n".encode()
-                last = payload
-            if job.status in ("completed", "failed"):
-                break
-            time.sleep(0.5)
-    return StreamingResponse(event_gen(), media_type="text/event-stream")
+                return
+            while True:
+                eid, data = item
+                if eid != last_event_id:
+                    yield frame(item)
+                    last_event_id = eid
+                if data["status"] in ("completed", "failed"):
+                    return
+                try:
+                    item = await asyncio.wait_for(q.get(), SSE_HEARTBEAT_SECS)
+                except asyncio.TimeoutError:
+                    yield b": heartbeat\n\n"
+                    # Safety net for a missed publish (e.g. Redis reconnect): re-read the row once per heartbeat
+                    item = await db_snapshot(replica=True) or item
+        finally:
+            broker.unsubscribe(job_id, q)
+
+    return StreamingResponse(event_gen(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 # --------------------- Webhooks ---------------------
 @app.get("/webhooks", response_model=list[WebhookOut])
-def list_webhooks(db: Session = Depends(get_db)):
-    items = db.query(models.Webhook).order_by(models.Webhook.id.desc()).all()
-    return [WebhookOut.model_validate(i) for i in items]
+async def list_webhooks(db: AsyncSession = Depends(get_read_db)):
+    rows = await db.execute(select(*WEBHOOK_OUT_COLUMNS).order_by(models.Webhook.id.desc()))
+    return ORJSONResponse([dict(r) for r in rows.mappings()])
 
 @app.post("/webhooks", response_model=WebhookOut)
-def create_webhook(payload: WebhookCreate, db: Session = Depends(get_db)):
+async def create_webhook(payload: WebhookCreate, db: AsyncSession = Depends(get_async_db)):
     if not (payload.url or "").strip():
         raise HTTPException(status_code=400, detail="URL is required")
     if not (payload.url.startswith("http://") or payload.url.startswith("https://")):
         raise HTTPException(status_code=400, detail="URL must start with http:// or https://")
     w = models.Webhook(url=payload.url.strip(), event=payload.event, enabled=payload.enabled)
     try:
-        db.add(w)
-        db.commit()
-        db.refresh(w)
+        w = await awrite(db, _add_row, w)
     except Exception as e:
         try:
-            db.rollback()
+            await db.rollback()
         except Exception:
             pass
         logging.getLogger("app.main").error(str(e))
@@ -232,60 +787,77 @@ def create_webhook(payload: WebhookCreate, db: Session = Depends(get_db)):
     return WebhookOut.model_validate(w)
 
 @app.put("/webhooks/{webhook_id}", response_model=WebhookOut)
-def update_webhook(webhook_id: int, payload: WebhookUpdate, db: Session = Depends(get_db)):
-    w = db.get(models.Webhook, webhook_id)
+async def update_webhook(webhook_id: int, payload: WebhookUpdate, db: AsyncSession = Depends(get_async_db)):
+    w = await db.get(models.Webhook, webhook_id)
     if not w:
         raise HTTPException(status_code=404, detail="Webhook not found")
+    fields = {}
     if payload.url is not None:
         if not payload.url.strip():
             raise HTTPException(status_code=400, detail="URL is required")
         if not (payload.url.startswith("http://") or payload.url.startswith("https://")):
             raise HTTPException(status_code=400, detail="URL must start with http:// or https://")
-        w.url = payload.url.strip()
-    if payload.event is not None:
-        w.event = payload.event
-    if payload.enabled is not None:
-        w.enabled = payload.enabled
+        fields["url"] = payload.url.strip()
+    for field in ("event", "enabled"):
+        if getattr(payload, field) is not None:
+            fields[field] = getattr(payload, field)
     try:
-        db.commit()
-        db.refresh(w)
+        w = await awrite(db, _update_row, models.Webhook, webhook_id, fields)
     except Exception as e:
         try:
-            db.rollback()
+            await db.rollback()
         except Exception:
             pass
         logging.getLogger("app.main").error(str(e))
         raise HTTPException(status_code=500, detail="Database error")
+    if w is None:
+        raise HTTPException(status_code=404, detail="Webhook not found")
     return WebhookOut.model_validate(w)
 
+def _delete_webhook(db: Session, webhook_id: int):
+    db.execute(delete(models.WebhookDelivery).filter(models.WebhookDelivery.webhook_id == webhook_id))
+    _delete_row(db, models.Webhook, webhook_id)
+
 @app.delete("/webhooks/{webhook_id}")
-def delete_webhook(webhook_id: int, db: Session = Depends(get_db)):
-    w = db.get(models.Webhook, webhook_id)
+async def delete_webhook(webhook_id: int, db: AsyncSession = Depends(get_async_db)):
+    w = await db.get(models.Webhook, webhook_id)
     if not w:
         raise HTTPException(status_code=404, detail="Webhook not found")
     try:
-        db.delete(w)
-        db.commit()
+        await awrite(db, _delete_webhook, webhook_id)
     except Exception as e:
         try:
-            db.rollback()
+            await db.rollback()
         except Exception:
             pass
         logging.getLogger("app.main").error(str(e))
         raise HTTPException(status_code=500, detail="Database error")
     return {"ok": True}
 
+@app.get("/webhooks/{webhook_id}/deliveries", response_model=list[WebhookDeliveryOut])
+async def list_webhook_deliveries(webhook_id: int, limit: int = Query(50, ge=1, le=500), db: AsyncSession = Depends(get_read_db)):
+    items = (
+        await db.scalars(
+            select(models.WebhookDelivery)
+            .filter(models.WebhookDelivery.webhook_id == webhook_id)
+            .order_by(models.WebhookDelivery.id.desc())
+            .limit(limit)
+        )
+    ).all()
+    return [WebhookDeliveryOut.model_validate(d) for d in items]
+
 @app.post("/webhooks/{webhook_id}/test")
-def test_webhook_trigger(webhook_id: int, db: Session = Depends(get_db)):
-    w = db.get(models.Webhook, webhook_id)
+async def test_webhook_trigger(webhook_id: int, db: AsyncSession = Depends(get_async_db)):
+    w = await db.get(models.Webhook, webhook_id)
     if not w:
         raise HTTPException(status_code=404, detail="Webhook not found")
-    result = test_webhook(w)
+    result = await test_webhook(w)
+    fields = {"last_status_code": result.get("status_code", -1), "last_response_ms": result.get("response_ms")}
     try:
-        db.commit()
+        await awrite(db, _update_row, models.Webhook, webhook_id, fields)
     except Exception as e:
         try:
-            db.rollback()
+            await db.rollback()
         except Exception:
             pass
         logging.getLogger("app.main").error(str(e))
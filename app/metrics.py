@@ -0,0 +1,134 @@
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+# With several processes (uvicorn workers, pool/Celery importers) point this at a shared empty dir
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+
+_FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+_STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time until response headers are sent, per route", ["method", "route"], buckets=_FAST_BUCKETS
+)
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+
+DB_STATEMENT_SECONDS = Histogram("db_statement_duration_seconds", "SQL statement latency by verb", ["verb"], buckets=_FAST_BUCKETS)
+DB_COMMITS = Counter("db_commits_total", "Transactions committed")
+DB_READ_SESSIONS = Counter("db_read_sessions_total", "Sessions opened for read-only routes, by where they read", ["target"])
+
+IMPORT_STAGE_SECONDS = Histogram(
+    "import_stage_duration_seconds",
+    "Wall time spent in each import stage, observed once per import",
+    ["stage"],
+    buckets=_STAGE_BUCKETS,
+)
+IMPORT_ROWS = Counter("import_rows_total", "CSV rows read by importers")
+IMPORT_JOBS = Counter("import_jobs_total", "Finished imports by outcome", ["status"])
+IMPORT_ROWS_PER_SECOND = Gauge(
+    "import_rows_per_second", "Rows/sec of each running import", ["job_id"], multiprocess_mode="livesum"
+)
+IMPORT_LAST_ROWS_PER_SECOND = Gauge(
+    "import_last_rows_per_second", "Rows/sec of the most recently finished import", multiprocess_mode="mostrecent"
+)
+IMPORT_SCHEDULER_JOBS = Gauge(
+    "import_scheduler_jobs", "In-process import jobs running on or waiting for a scheduler worker", ["state"], multiprocess_mode="livesum"
+)
+
+WEBHOOK_DELIVERIES_IN_FLIGHT = Gauge(
+    "webhook_deliveries_in_flight", "Webhook deliveries being sent or retried by the delivery queue", multiprocess_mode="livesum"
+)
+
+CACHE_REQUESTS = Counter("cache_requests_total", "Read-through cache lookups by cache and result", ["cache", "result"])
+
+_VERBS = ("select", "insert", "update", "delete", "copy", "pragma", "create", "alter")
+# Resolved label children: a dict lookup per statement instead of labels() parsing
+statement_timers = {v: DB_STATEMENT_SECONDS.labels(v) for v in _VERBS + ("other",)}
+
+def statement_timer(statement: str):
+    words = statement.lstrip()[:7].split(None, 1)
+    return statement_timers.get(words[0].lower() if words else "") or statement_timers["other"]
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: request count and time-to-headers per route template.
+
+    Timing stops at ``http.response.start`` so long-lived SSE streams measure their setup,
+    not the whole connection. Requests that match no route share the ``other`` label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        observed = False
+
+        def observe(status: int):
+            route = scope.get("route")
+            label = getattr(route, "path", None) or "other"
+            HTTP_REQUEST_SECONDS.labels(scope["method"], label).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(scope["method"], label, str(status)).inc()
+
+        async def send_wrapper(message):
+            nonlocal observed
+            if message["type"] == "http.response.start" and not observed:
+                observed = True
+                observe(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            if not observed:
+                observe(500)
+            raise
+
+class ImportTimer:
+    """Accumulates one import's wall time per stage and keeps its rows/sec gauge current."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.started = time.perf_counter()
+        self.totals: dict[str, float] = defaultdict(float)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] += time.perf_counter() - start
+
+    def add(self, name: str, seconds: float):
+        self.totals[name] += seconds
+
+    def rows(self, processed: int):
+        IMPORT_ROWS_PER_SECOND.labels(self.job_id).set(processed / max(time.perf_counter() - self.started, 1e-9))
+
+    def finish(self, status: str, rows: int = 0):
+        elapsed = time.perf_counter() - self.started
+        for name, seconds in self.totals.items():
+            IMPORT_STAGE_SECONDS.labels(name).observe(seconds)
+        IMPORT_STAGE_SECONDS.labels("total").observe(elapsed)
+        IMPORT_ROWS.inc(rows)
+        IMPORT_JOBS.labels(status).inc()
+        if status == "completed":
+            IMPORT_LAST_ROWS_PER_SECOND.set(rows / max(elapsed, 1e-9))
+        try:
+            IMPORT_ROWS_PER_SECOND.remove(self.job_id)
+        except KeyError:
+            pass
+
+def render() -> tuple[bytes, str]:
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,8 +1,14 @@
-from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime
+import hashlib
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Text, DateTime, event
 from sqlalchemy.orm import Mapped, mapped_column
 from datetime import datetime
 from .database import Base
 
+def product_hash(sku: str, name: str, description: str | None) -> str:
+    # Must match the md5() expression the PostgreSQL COPY merge computes
+    data = f"{sku}\x1f{name}\x1f{description or ''}".encode("utf-8")
+    return hashlib.md5(data, usedforsecurity=False).hexdigest()
+
 class Product(Base):
     __tablename__ = "products"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
@@ -13,6 +19,18 @@ class Product(Base):
     active: Mapped[bool] = mapped_column(Boolean, default=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Last parallel import that wrote this row and the byte offset of the record it came from;
+    # lets concurrent chunks of one file resolve a repeated SKU to its last occurrence
+    import_job_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    import_offset: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    # product_hash() of the imported columns; lets re-imports skip rows that did not change
+    content_hash: Mapped[str | None] = mapped_column(String(32), nullable=True)
+
+@event.listens_for(Product, "before_insert")
+@event.listens_for(Product, "before_update")
+def _set_content_hash(mapper, connection, target):
+    # CRUD edits go through the ORM; keep the hash in step so a re-import notices them
+    target.content_hash = product_hash(target.sku, target.name, target.description)
 
 class Webhook(Base):
     __tablename__ = "webhooks"
@@ -23,6 +41,21 @@ class Webhook(Base):
     last_status_code: Mapped[int | None] = mapped_column(Integer, nullable=True)
     last_response_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
+class WebhookDelivery(Base):
+    # One row per event per subscriber; outcomes are written in batches by the delivery queue
+    __tablename__ = "webhook_deliveries"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    webhook_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    event: Mapped[str] = mapped_column(String(100), nullable=False)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[str] = mapped_column(String(20), default="pending")  # pending|delivered|failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    status_code: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    response_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
 class JobProgress(Base):
     __tablename__ = "jobs"
     id: Mapped[str] = mapped_column(String(64), primary_key=True)
@@ -30,6 +63,32 @@ class JobProgress(Base):
     status: Mapped[str] = mapped_column(String(50), default="queued")  # queued|running|completed|failed
     processed_rows: Mapped[int] = mapped_column(Integer, default=0)
     total_rows: Mapped[int] = mapped_column(Integer, default=0)
+    processed_bytes: Mapped[int] = mapped_column(BigInteger, default=0)
+    total_bytes: Mapped[int] = mapped_column(BigInteger, default=0)
+    inserted_rows: Mapped[int] = mapped_column(Integer, default=0)
+    updated_rows: Mapped[int] = mapped_column(Integer, default=0)
+    unchanged_rows: Mapped[int] = mapped_column(Integer, default=0)
+    # Products a replace import removed because the file no longer lists them
+    deleted_rows: Mapped[int] = mapped_column(Integer, default=0)
+    # Position after the last committed batch of a single-reader import: CSV records read and the
+    # byte offset in the decompressed file (NULL when the reader cannot tell, e.g. pyarrow)
+    checkpoint_rows: Mapped[int] = mapped_column(Integer, default=0)
+    checkpoint_offset: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
     error_message: Mapped[str | None] = mapped_column(Text, nullable=True)
     started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
-    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
\ No newline at end of file
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class ImportChunk(Base):
+    # One byte range of a parallel import; offset and counters advance in each batch's transaction
+    __tablename__ = "import_chunks"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    job_id: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    start: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    end: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    offset: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    rows: Mapped[int] = mapped_column(Integer, default=0)
+    processed_rows: Mapped[int] = mapped_column(Integer, default=0)
+    inserted_rows: Mapped[int] = mapped_column(Integer, default=0)
+    updated_rows: Mapped[int] = mapped_column(Integer, default=0)
+    unchanged_rows: Mapped[int] = mapped_column(Integer, default=0)
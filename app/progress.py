@@ -0,0 +1,118 @@
+import os
+import time
+import logging
+import threading
+
+from sqlalchemy import update
+
+from .database import SessionLocal
+from .writer import write
+from .events import broker
+from .schemas import JobStatus
+from . import models
+
+# Seconds between progress writes per process; 0 writes on every report (no coalescing)
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "0.5"))
+
+logger = logging.getLogger("app.progress")
+
+class ProgressWriter:
+    """Coalesces job progress in memory and writes it off the import's session.
+
+    Importers call ``set`` (absolute counters), ``add`` (deltas from parallel chunks) or
+    ``publish`` (the row was already written in the batch's transaction) after each batch;
+    the call only updates a dict. A background thread writes the newest values for
+    every job in one transaction on its own session every ``interval`` seconds and publishes
+    the snapshots to SSE subscribers. ``flush`` writes a job's pending progress right away.
+    """
+
+    def __init__(self, interval: float = JOB_PROGRESS_INTERVAL):
+        self.interval = interval
+        self._reset()
+
+    def _reset(self):
+        # Also runs in forked children: they must not replay the parent's pending progress
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._set: dict[str, dict] = {}
+        self._add: dict[str, dict[str, int]] = {}
+        self._thread: threading.Thread | None = None
+
+    def set(self, job_id: str, **fields):
+        with self._lock:
+            self._set.setdefault(job_id, {}).update(fields)
+        self._schedule(job_id)
+
+    def add(self, job_id: str, **deltas: int):
+        with self._lock:
+            pending = self._add.setdefault(job_id, {})
+            for k, v in deltas.items():
+                pending[k] = pending.get(k, 0) + v
+        self._schedule(job_id)
+
+    def publish(self, job_id: str):
+        # Snapshot only: nothing to write, but subscribers get the job's committed state
+        with self._lock:
+            self._set.setdefault(job_id, {})
+        self._schedule(job_id)
+
+    def flush(self, job_id: str | None = None):
+        # Serialized with the background flush, so a later direct write to the job always wins
+        with self._flush_lock:
+            with self._lock:
+                if job_id is None:
+                    sets, adds = self._set, self._add
+                    self._set, self._add = {}, {}
+                else:
+                    sets = {job_id: self._set.pop(job_id)} if job_id in self._set else {}
+                    adds = {job_id: self._add.pop(job_id)} if job_id in self._add else {}
+            if sets or adds:
+                self._write(sets, adds)
+
+    def _schedule(self, job_id: str):
+        if self.interval <= 0:
+            self.flush(job_id)
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="job-progress", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(str(e))
+
+    def _write(self, sets: dict[str, dict], adds: dict[str, dict[str, int]]):
+        job = models.JobProgress
+        db = SessionLocal()
+        try:
+            write(db, _apply, sets, adds)
+            for j in db.query(job).filter(job.id.in_(set(sets) | set(adds))):
+                broker.publish(j.id, JobStatus.model_validate(j).model_dump())
+        except Exception as e:
+            try:
+                db.rollback()
+            except Exception:
+                pass
+            logger.error(str(e))
+        finally:
+            db.close()
+
+def _apply(db, sets: dict[str, dict], adds: dict[str, dict[str, int]]):
+    job = models.JobProgress
+    # One statement per job: a job deleted mid-import must not sink the others' progress
+    for k, fields in sets.items():
+        if fields:
+            db.execute(update(job).where(job.id == k).values(**fields))
+    # Deltas are applied in SQL so chunk workers in other processes add up
+    for k, deltas in adds.items():
+        db.execute(update(job).where(job.id == k).values({c: getattr(job, c) + v for c, v in deltas.items()}))
+
+progress = ProgressWriter()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=progress._reset)
@@ -0,0 +1,96 @@
+import os
+import queue
+import threading
+import time
+import logging
+from typing import Callable
+
+from .metrics import IMPORT_SCHEDULER_JOBS
+
+logger = logging.getLogger("app.scheduler")
+
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "2"))
+IMPORT_QUEUE_DEPTH = int(os.getenv("IMPORT_QUEUE_DEPTH", "20"))
+IMPORT_DRAIN_TIMEOUT = float(os.getenv("IMPORT_DRAIN_TIMEOUT", "30"))
+
+class QueueFull(Exception):
+    pass
+
+class JobScheduler:
+    """Runs import jobs on a fixed number of worker threads behind a bounded FIFO queue.
+
+    ``submit`` never blocks: it raises QueueFull when ``queue_depth`` jobs are already
+    waiting or the scheduler is shutting down. ``shutdown`` stops intake and lets the
+    workers drain queued jobs until the timeout; jobs still waiting after that are handed
+    to ``on_abandon`` so their status can be closed out.
+    """
+
+    def __init__(self, concurrency: int, queue_depth: int, on_abandon: Callable[[str], None] | None = None):
+        self.concurrency = max(1, concurrency)
+        self.queue_depth = max(0, queue_depth)
+        self.on_abandon = on_abandon
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+        self._running = 0
+        self._closed = False
+
+    def submit(self, job_id: str, fn: Callable, *args):
+        with self._lock:
+            if self._closed:
+                raise QueueFull("Server is shutting down")
+            if self._queue.qsize() >= self.queue_depth and self._running >= self.concurrency:
+                raise QueueFull(f"Import queue is full ({self.queue_depth} jobs waiting)")
+            if not self._threads:
+                for i in range(self.concurrency):
+                    t = threading.Thread(target=self._worker, name=f"import-worker-{i}", daemon=True)
+                    t.start()
+                    self._threads.append(t)
+            self._queue.put((job_id, fn, args))
+            IMPORT_SCHEDULER_JOBS.labels("queued").inc()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            job_id, fn, args = item
+            with self._lock:
+                self._running += 1
+            IMPORT_SCHEDULER_JOBS.labels("queued").dec()
+            IMPORT_SCHEDULER_JOBS.labels("running").inc()
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.error("Job %s crashed: %s", job_id, e)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                IMPORT_SCHEDULER_JOBS.labels("running").dec()
+
+    def shutdown(self, timeout: float = IMPORT_DRAIN_TIMEOUT):
+        with self._lock:
+            self._closed = True
+            threads = list(self._threads)
+        # Sentinels queue up behind pending jobs, so workers exit once the queue is drained
+        for _ in threads:
+            self._queue.put(None)
+        deadline = time.monotonic() + timeout
+        for t in threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        abandoned = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                IMPORT_SCHEDULER_JOBS.labels("queued").dec()
+                abandoned.append(item[0])
+        for job_id in abandoned:
+            logger.warning("Job %s was still queued at shutdown", job_id)
+            if self.on_abandon:
+                try:
+                    self.on_abandon(job_id)
+                except Exception as e:
+                    logger.error(str(e))
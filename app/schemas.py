@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional, List
+from datetime import datetime
 
 class ProductBase(BaseModel):
     sku: str
@@ -26,10 +27,12 @@ class ProductOut(BaseModel):
         from_attributes = True
 
 class PaginatedProducts(BaseModel):
-    total: int
+    total: Optional[int] = None
+    total_estimated: bool = False
     page: int
     page_size: int
     items: List[ProductOut]
+    next_cursor: Optional[str] = None
 
 class WebhookCreate(BaseModel):
     url: str
@@ -51,10 +54,33 @@ class WebhookOut(BaseModel):
     class Config:
         from_attributes = True
 
+class WebhookDeliveryOut(BaseModel):
+    id: int
+    webhook_id: int
+    event: str
+    status: str
+    attempts: int
+    status_code: Optional[int] = None
+    response_ms: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
 class JobStatus(BaseModel):
     id: str
     stage: str
     status: str
     processed_rows: int
     total_rows: int
-    error_message: Optional[str] = None
\ No newline at end of file
+    processed_bytes: int = 0
+    total_bytes: int = 0
+    inserted_rows: int = 0
+    updated_rows: int = 0
+    unchanged_rows: int = 0
+    deleted_rows: int = 0
+    checkpoint_rows: int = 0
+    error_message: Optional[str] = None
+    class Config:
+        from_attributes = True
\ No newline at end of file
@@ -0,0 +1,140 @@
+import os
+import logging
+
+from sqlalchemy import Table, Column, Integer, Text, MetaData, func, literal_column, or_
+
+from . import models
+
+logger = logging.getLogger("app.search")
+
+# The index costs write throughput (SQLite imports run several times slower); false keeps ILIKE scans
+SEARCH_INDEX = os.getenv("SEARCH_INDEX", "true").lower() == "true"
+# FTS5 trigram terms shorter than this have no index entries; they fall back to LIKE
+MIN_TERM_LENGTH = 3
+
+# External-content FTS5 index over products(name, description), kept in sync by triggers so
+# imports, CRUD and bulk writes never have to maintain it themselves. Lives outside Base.metadata.
+products_fts = Table(
+    "products_fts",
+    MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("name", Text),
+    Column("description", Text),
+)
+
+_SQLITE_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, description, content='products', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    # Re-imports rewrite every row; only touch the index when the text actually changed
+    """CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description ON products
+    WHEN old.name IS NOT new.name OR old.description IS NOT new.description BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+)
+
+_SQLITE_DROP = (
+    "DROP TRIGGER IF EXISTS products_fts_ai",
+    "DROP TRIGGER IF EXISTS products_fts_ad",
+    "DROP TRIGGER IF EXISTS products_fts_au",
+    "DROP TABLE IF EXISTS products_fts",
+)
+
+_POSTGRES_INDEXES = {"ix_products_name_trgm": "name", "ix_products_description_trgm": "description"}
+
+_POSTGRES_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    *(f"CREATE INDEX IF NOT EXISTS {ix} ON products USING gin ({col} gin_trgm_ops)" for ix, col in _POSTGRES_INDEXES.items()),
+)
+
+# Set by init_search(); None means plain ILIKE scans
+backend: str | None = None
+
+def init_search(conn):
+    global backend
+    dialect = conn.dialect.name
+    if not SEARCH_INDEX:
+        if dialect == "sqlite":
+            # Stop paying for trigger maintenance; re-enabling rebuilds the index
+            for ddl in _SQLITE_DROP:
+                conn.exec_driver_sql(ddl)
+        return
+    try:
+        with conn.begin_nested():
+            if dialect == "sqlite":
+                created = not conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'").first()
+                for ddl in _SQLITE_DDL:
+                    conn.exec_driver_sql(ddl)
+                if created:
+                    # Index rows that existed before the FTS table
+                    conn.exec_driver_sql("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+            elif dialect == "postgresql":
+                for ddl in _POSTGRES_DDL:
+                    conn.exec_driver_sql(ddl)
+            else:
+                return
+        backend = dialect
+    except Exception as e:
+        # e.g. SQLite built without FTS5 / older than 3.34, or no rights to CREATE EXTENSION
+        logger.warning(f"Full-text search unavailable, using ILIKE scans: {e}")
+
+def _fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+def _terms(name: str | None, description: str | None) -> dict[str, str]:
+    return {col: t for col, t in (("name", name), ("description", description)) if t}
+
+def _uses_fts(terms: dict[str, str]) -> bool:
+    return backend == "sqlite" and all(len(t) >= MIN_TERM_LENGTH for t in terms.values())
+
+def apply_text_search(q, name: str | None, description: str | None):
+    # Filters a Product query on name/description substrings, like the old ILIKE '%term%'
+    P = models.Product
+    terms = _terms(name, description)
+    if not terms:
+        return q
+    if _uses_fts(terms):
+        match = " AND ".join(f"{col} : {_fts_phrase(t)}" for col, t in terms.items())
+        return q.join(products_fts, products_fts.c.rowid == P.id).filter(literal_column("products_fts").op("MATCH")(match))
+    for col, t in terms.items():
+        q = q.filter(getattr(P, col).ilike(f"%{t}%"))
+    return q
+
+def relevance_order(name: str | None, description: str | None) -> list:
+    # ORDER BY clauses, best match first, for a query filtered by apply_text_search
+    P = models.Product
+    terms = _terms(name, description)
+    if not terms:
+        return []
+    if _uses_fts(terms):
+        return [func.bm25(literal_column("products_fts"))]
+    if backend == "postgresql":
+        return [func.greatest(*[func.similarity(getattr(P, col), t) for col, t in terms.items()]).desc()]
+    # No index to rank with: prefer rows where the term starts the field
+    return [or_(*[getattr(P, col).ilike(f"{t}%") for col, t in terms.items()]).desc()]
+
+def index_shadow(conn, table: str) -> list[tuple[str, str]]:
+    # PostgreSQL: builds the trigram indexes on a replacement products table under temporary
+    # names; returns (temporary, final) names to rename once it has become products
+    if backend != "postgresql":
+        return []
+    renames = []
+    for ix, col in _POSTGRES_INDEXES.items():
+        conn.exec_driver_sql(f"CREATE INDEX {ix}_shadow ON {table} USING gin ({col} gin_trgm_ops)")
+        renames.append((f"{ix}_shadow", ix))
+    return renames
+
+def reindex_swapped(conn):
+    # SQLite: a swapped-in products table has no triggers and the FTS index still holds the old rows
+    if backend != "sqlite":
+        return
+    for ddl in _SQLITE_DDL:
+        conn.exec_driver_sql(ddl)
+    conn.exec_driver_sql("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
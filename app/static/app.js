@@ -1,4 +1,5 @@
-const state = { page: 1, pageSize: 10, filters: { sku: '', name: '', description: '', active: '' } };
+// cursors[i] is the keyset cursor that opens page i+1 (page 1 has none)
+const state = { page: 1, pageSize: 10, cursors: [null], filters: { sku: '', name: '', description: '', active: '' } };
 
 // -------- Upload --------
 const uploadForm = document.getElementById('upload-form');
@@ -21,10 +22,15 @@ uploadForm.addEventListener('submit', async (e) => {
   const es = new EventSource(`/jobs/${job.id}/events`);
   es.onmessage = (ev) => {
     const data = JSON.parse(ev.data);
-    const { stage, status, processed_rows, total_rows, error_message } = data;
-    const pct = total_rows > 0 ? Math.floor((processed_rows / total_rows) * 100) : 0;
+    const { stage, status, processed_rows, total_rows, processed_bytes, total_bytes, error_message } = data;
+    // Single-pass imports only learn total_rows at the end; estimate from bytes read until then
+    let pct = 0;
+    if (total_rows > 0) pct = Math.floor((processed_rows / total_rows) * 100);
+    else if (total_bytes > 0) pct = Math.floor((processed_bytes / total_bytes) * 100);
     progressBar.style.width = `${pct}%`;
-    progressText.textContent = `${stage} — ${pct}% (${processed_rows}/${total_rows})`;
+    progressText.textContent = total_rows > 0
+      ? `${stage} — ${pct}% (${processed_rows}/${total_rows})`
+      : `${stage} — ${pct}% (${processed_rows} rows)`;
     if (status === 'failed') { progressError.textContent = error_message || 'Import failed'; progressError.style.display = 'block'; es.close(); }
     if (status === 'completed') { progressText.textContent = 'Import Complete'; es.close(); loadProducts(); }
   };
@@ -41,20 +47,22 @@ document.getElementById('apply-filters').addEventListener('click', () => {
   state.filters.name = document.getElementById('filter-name').value;
   state.filters.description = document.getElementById('filter-description').value;
   state.filters.active = document.getElementById('filter-active').value;
-  state.page = 1; loadProducts();
+  state.page = 1; state.cursors = [null]; loadProducts();
 });
 
 document.getElementById('prev-page').addEventListener('click', () => { if (state.page > 1) { state.page--; loadProducts(); } });
-document.getElementById('next-page').addEventListener('click', () => { state.page++; loadProducts(); });
+document.getElementById('next-page').addEventListener('click', () => { if (state.cursors[state.page]) { state.page++; loadProducts(); } });
 
 document.getElementById('bulk-delete').addEventListener('click', async () => {
   if (!confirm('Are you sure? This cannot be undone.')) return;
   const res = await fetch('/products', { method: 'DELETE' });
-  if (res.ok) { alert('All products deleted'); loadProducts(); }
+  if (res.ok) { alert('All products deleted'); state.page = 1; state.cursors = [null]; loadProducts(); }
 });
 
 async function loadProducts(){
-  const params = new URLSearchParams({ page: state.page, page_size: state.pageSize });
+  const params = new URLSearchParams({ page: state.page, page_size: state.pageSize, count: 'cached' });
+  const cursor = state.cursors[state.page - 1];
+  if (cursor) params.append('cursor', cursor);
   if (state.filters.sku) params.append('sku', state.filters.sku);
   if (state.filters.name) params.append('name', state.filters.name);
   if (state.filters.description) params.append('description', state.filters.description);
@@ -71,7 +79,8 @@ async function loadProducts(){
       </td>`;
     tbody.appendChild(tr);
   });
-  pageInfo.textContent = `Page ${data.page} • ${data.total} total`;
+  state.cursors[state.page] = data.next_cursor;
+  pageInfo.textContent = `Page ${data.page} • ${data.total_estimated ? '~' : ''}${data.total} total`;
 }
 
 tbody.addEventListener('click', async (e) => {
@@ -1,27 +1,50 @@
 import csv
 import sys
 import os
+import time
 import logging
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import islice
 from typing import Callable
 
-from .database import SessionLocal
-from . import models
+from sqlalchemy import update
+
+from .database import SessionLocal, DATABASE_URL, engine, invalidate_statement_caches
+from . import models, columnar
+from .bulk import ProductBatch, CatalogReplace, normalize_row, upsert_products, copy_merge_products
+from .csvio import ByteLines, csv_lines, open_csv_stream, sniff_codec, read_header, skip_bytes, split_ranges
 from .webhooks import dispatch_event
+from .events import broker
+from .progress import progress
+from .writer import writer, write
+from .cache import invalidate_products
+from .metrics import ImportTimer
+from .schemas import JobStatus
 
 logger = logging.getLogger("app.tasks")
 BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "2000"))
+# batch: bulk upserts per BATCH_SIZE rows; copy: PostgreSQL COPY into a staging table, then one merge;
+# replace: the file becomes the whole catalog, swapped in from a shadow table
+IMPORT_MODE = os.getenv("IMPORT_MODE", "batch").lower()
+IMPORT_MODES = ("batch", "copy", "replace")
+# Pre-scan the file to report an exact row total up front (costs a second full read)
+IMPORT_COUNT_ROWS = os.getenv("IMPORT_COUNT_ROWS", "false").lower() == "true"
+# >1 splits large files into record-aligned byte ranges imported in parallel
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "1"))
+IMPORT_PARALLEL_MIN_BYTES = int(os.getenv("IMPORT_PARALLEL_MIN_BYTES", str(8 * 1024 * 1024)))
+# Celery retries of an interrupted import; each retry resumes from the last checkpoint
+IMPORT_MAX_RETRIES = int(os.getenv("IMPORT_MAX_RETRIES", "3"))
+IMPORT_RETRY_BACKOFF_SECS = float(os.getenv("IMPORT_RETRY_BACKOFF_SECS", "30"))
 csv.field_size_limit(sys.maxsize)
 
 def _update_job(db, job_id: str, **kwargs):
+    # Write coalesced progress first so it can never land on top of this update
+    progress.flush(job_id)
     try:
-        job = db.get(models.JobProgress, job_id)
-        if not job:
-            job = models.JobProgress(id=job_id)
-            db.add(job)
-        for k, v in kwargs.items():
-            setattr(job, k, v)
-        db.commit()
+        broker.publish(job_id, write(db, _set_job, job_id, kwargs))
     except Exception as e:
         try:
             db.rollback()
@@ -29,106 +52,564 @@ def _update_job(db, job_id: str, **kwargs):
             pass
         logger.error(str(e))
 
-def _process_row(db, row: dict):
-    sku = (row.get("sku") or "").strip()
-    if not sku:
-        return False
-    name = (row.get("name") or sku).strip()
-    description = (row.get("description") or "").strip()
+def _set_job(db, job_id: str, fields: dict) -> dict:
+    job = db.get(models.JobProgress, job_id)
+    if not job:
+        job = models.JobProgress(id=job_id)
+        db.add(job)
+    for k, v in fields.items():
+        setattr(job, k, v)
+    db.flush()
+    return JobStatus.model_validate(job).model_dump()
+
+def _count_fields(counts: Counter) -> dict:
+    return {"inserted_rows": counts["inserted"], "updated_rows": counts["updated"], "unchanged_rows": counts["unchanged"]}
+
+def _save_checkpoint(db, job_id: str, counts: Counter, **position):
+    job = models.JobProgress
+    db.execute(update(job).where(job.id == job_id).values(**position, **_count_fields(counts)))
+
+def _load_checkpoint(db, job_id: str) -> dict | None:
+    # Where the job's last committed batch left off; None if no batch was committed yet
+    job = db.get(models.JobProgress, job_id)
+    if job is None or not job.checkpoint_rows:
+        return None
+    return {
+        "rows": job.checkpoint_rows,
+        "offset": job.checkpoint_offset,
+        "processed": job.processed_rows,
+        "counts": Counter(inserted=job.inserted_rows, updated=job.updated_rows, unchanged=job.unchanged_rows),
+    }
+
+def _flush_batch(db, job_id: str, batch: ProductBatch, counts: Counter, timer: ImportTimer, **position) -> bool:
+    # ``position`` (checkpoint_rows, checkpoint_offset, processed_rows, processed_bytes) is where the
+    # reader stands after this batch; it commits with the rows, so a resume never writes them twice
     try:
-        sku_lower = sku.lower()
-        existing = db.query(models.Product).filter(models.Product.sku_lower == sku_lower).one_or_none()
-        if existing:
-            existing.sku = sku
-            existing.sku_lower = sku_lower
-            existing.name = name
-            existing.description = description
-            existing.updated_at = datetime.utcnow()
-        else:
-            p = models.Product(
-                sku=sku,
-                sku_lower=sku_lower,
-                name=name,
-                description=description,
-                active=True,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow(),
-            )
-            db.add(p)
-        return True
+        with timer.stage("upsert"):
+            if writer is not None:
+                # Runs and commits on the writer thread, in a transaction of its own
+                written = writer.run(_write_batch, job_id, batch.rows.values(), counts, position, alone=True)
+            else:
+                written = _write_batch(db, job_id, batch.rows.values(), counts, position)
+        with timer.stage("commit"):
+            db.commit()
+        invalidate_products(batch.rows.keys())
     except Exception as e:
+        try:
+            db.rollback()
+        except Exception:
+            pass
+        _update_job(db, job_id, stage="failed", status="failed", error_message=str(e), finished_at=datetime.utcnow())
         logger.error(str(e))
         return False
+    counts.update(written)
+    batch.clear()
+    progress.publish(job_id)
+    return True
 
-# Local background importer (FastAPI runtime)
-def import_csv_background(job_id: str, csv_path: str):
-    db = SessionLocal()
-    try:
-        _update_job(db, job_id, stage="parsing", status="running", started_at=datetime.utcnow())
-        # Count rows first to show total
-        total = 0
-        with open(csv_path, "r", encoding="utf-8", newline="") as f:
-            reader = csv.DictReader(f)
-            headers = [h.strip().lower() for h in (reader.fieldnames or [])]
-            if "sku" not in headers:
-                _update_job(db, job_id, stage="failed", status="failed", error_message="CSV must include header 'sku'", finished_at=datetime.utcnow())
-                return
-            for _ in reader:
+def _write_batch(db, job_id: str, rows, counts: Counter, position: dict) -> Counter:
+    written = upsert_products(db, rows)
+    _save_checkpoint(db, job_id, counts + written, **position)
+    return written
+
+def _import_batches(db, job_id: str, csv_path: str, fieldnames: list[str], timer: ImportTimer):
+    total_bytes = os.path.getsize(csv_path)
+    total = 0
+    if IMPORT_COUNT_ROWS:
+        with timer.stage("count"), open(csv_path, "rb") as f:
+            for _ in csv.DictReader(csv_lines(f)):
                 total += 1
-        _update_job(db, job_id, total_rows=total, stage="importing")
+    _update_job(db, job_id, total_rows=total, total_bytes=total_bytes, stage="importing")
+
+    checkpoint = _load_checkpoint(db, job_id)
+    if checkpoint is None and columnar.use_arrow() and columnar.supports_header(fieldnames):
+        try:
+            return _import_arrow(db, job_id, csv_path, fieldnames, timer)
+        except columnar.FALLBACK_ERRORS as e:
+            # Rows pyarrow cannot read like csv.DictReader; carry on from its last committed batch
+            logger.info("Job %s: continuing with csv.DictReader: %s", job_id, e)
+            checkpoint = _load_checkpoint(db, job_id)
+    if checkpoint is not None:
+        logger.info("Job %s: resuming after row %s", job_id, checkpoint["rows"])
+    with open(csv_path, "rb") as f:
+        lines, reader = _open_at(f, fieldnames, checkpoint)
+        return _import_rows(db, job_id, lines, reader, timer, checkpoint)
+
+def _open_at(f, fieldnames: list[str], checkpoint: dict | None):
+    # Positions a DictReader over ``f`` just past the checkpoint's last committed record
+    stream, _, counter = open_csv_stream(f)
+    if checkpoint is None:
+        lines = ByteLines(stream, counter=counter)
+        return lines, csv.DictReader(lines)
+    offset = checkpoint["offset"]
+    if offset is None:
+        # Only the record count is known (pyarrow checkpoints): parse up to it, writing nothing
+        lines = ByteLines(stream, counter=counter)
+        reader = csv.DictReader(lines)
+        for _ in islice(reader, checkpoint["rows"]):
+            pass
+        return lines, reader
+    if counter is None:
+        stream.seek(offset)
+    else:
+        skip_bytes(stream, offset)
+    lines = ByteLines(stream, counter=counter, start=offset)
+    return lines, csv.DictReader(lines, fieldnames=fieldnames)
+
+def _import_arrow(db, job_id: str, csv_path: str, fieldnames: list[str], timer: ImportTimer):
+    rows = 0
+    processed = 0
+    counts = Counter()
+    batch = ProductBatch()
+    with open(csv_path, "rb") as f:
+        stream, _, counter = open_csv_stream(f)
+        mark = time.perf_counter()
+        for record_batch in columnar.open_batches(stream, fieldnames):
+            items, positions = columnar.normalize_batch(record_batch)
+            start = 0
+            while start < len(items):
+                take = BATCH_SIZE - len(batch)
+                batch.extend(items[start:start + take])
+                start = min(start + take, len(items))
+                if len(batch) >= BATCH_SIZE:
+                    # Records up to and including the one behind the last item flushed
+                    done = rows + (positions[start - 1] if positions is not None else start - 1) + 1
+                    timer.add("read", time.perf_counter() - mark)
+                    if not _flush_batch(
+                        db, job_id, batch, counts, timer,
+                        checkpoint_rows=done,
+                        checkpoint_offset=None,
+                        processed_rows=processed + start,
+                        processed_bytes=counter.count if counter else f.tell(),
+                    ):
+                        return None
+                    timer.rows(done)
+                    mark = time.perf_counter()
+            rows += record_batch.num_rows
+            processed += len(items)
+        timer.add("read", time.perf_counter() - mark)
+        if len(batch) and not _flush_batch(
+            db, job_id, batch, counts, timer,
+            checkpoint_rows=rows,
+            checkpoint_offset=None,
+            processed_rows=processed,
+            processed_bytes=counter.count if counter else f.tell(),
+        ):
+            return None
+    return rows, processed, counts
+
+def _import_rows(db, job_id: str, lines: ByteLines, reader, timer: ImportTimer, checkpoint: dict | None = None):
+    rows = checkpoint["rows"] if checkpoint else 0
+    processed = checkpoint["processed"] if checkpoint else 0
+    counts = Counter(checkpoint["counts"]) if checkpoint else Counter()
+    batch = ProductBatch()
+    # "read" is parsing and normalizing rows: loop time outside of batch flushes
+    mark = time.perf_counter()
+    for row in reader:
+        rows += 1
+        if batch.add(row):
+            processed += 1
+        if len(batch) >= BATCH_SIZE:
+            timer.add("read", time.perf_counter() - mark)
+            # csv.reader pulls lines only as a record needs them, so ``consumed`` ends on this record
+            if not _flush_batch(
+                db, job_id, batch, counts, timer,
+                checkpoint_rows=rows,
+                checkpoint_offset=lines.consumed,
+                processed_rows=processed,
+                processed_bytes=lines.progress,
+            ):
+                return None
+            timer.rows(rows)
+            mark = time.perf_counter()
+    timer.add("read", time.perf_counter() - mark)
+    if len(batch) and not _flush_batch(
+        db, job_id, batch, counts, timer,
+        checkpoint_rows=rows,
+        checkpoint_offset=lines.consumed,
+        processed_rows=processed,
+        processed_bytes=lines.progress,
+    ):
+        return None
+    # Single pass: the exact row total is only known once the whole file has been read
+    return rows, processed, counts
+
+def _import_copy(db, job_id: str, csv_path: str, fieldnames: list[str]):
+    _update_job(db, job_id, stage="copying", total_bytes=os.path.getsize(csv_path))
+    with open(csv_path, "rb") as f:
+        stream, _, _ = open_csv_stream(f)
+        result = copy_merge_products(db, stream, fieldnames)
+    db.commit()
+    invalidate_products()
+    return result
+
+def _import_replace(db, job_id: str, csv_path: str, timer: ImportTimer):
+    _update_job(db, job_id, stage="importing", total_bytes=os.path.getsize(csv_path))
+    rows = 0
+    processed = 0
+    batch = []
+    with open(csv_path, "rb") as f, CatalogReplace(engine) as replace:
+        lines = csv_lines(f)
+        mark = time.perf_counter()
+        for row in csv.DictReader(lines):
+            rows += 1
+            item = normalize_row(row)
+            if item is None:
+                continue
+            processed += 1
+            batch.append(item)
+            if len(batch) >= BATCH_SIZE:
+                timer.add("read", time.perf_counter() - mark)
+                with timer.stage("stage"):
+                    replace.stage(batch)
+                batch = []
+                progress.set(job_id, processed_rows=processed, processed_bytes=lines.progress)
+                timer.rows(rows)
+                mark = time.perf_counter()
+        timer.add("read", time.perf_counter() - mark)
+        with timer.stage("stage"):
+            replace.stage(batch)
+        if not processed:
+            # A file without products would empty the catalog; DELETE /products does that on purpose
+            raise ValueError("Replace import found no products in the file; the catalog was left unchanged")
+        _update_job(db, job_id, stage="swapping", processed_rows=processed, processed_bytes=lines.progress)
+        with timer.stage("swap"):
+            counts = replace.swap()
+    invalidate_statement_caches()
+    invalidate_products()
+    return rows, processed, counts
 
-        processed = 0
-        with open(csv_path, "r", encoding="utf-8", newline="") as f:
-            reader = csv.DictReader(f)
-            batch = 0
+def _commit_chunk_batch(db, job_id: str, chunk_id: int, batch: ProductBatch, counts: Counter, **position) -> Counter:
+    # The chunk's offset and counters commit with the rows they cover
+    written = upsert_products(db, batch.rows.values(), job_id)
+    counts.update(written)
+    chunk = models.ImportChunk
+    db.execute(update(chunk).where(chunk.id == chunk_id).values(**position, **_count_fields(counts)))
+    db.commit()
+    invalidate_products(batch.rows.keys())
+    batch.clear()
+    return written
+
+# Parse and upsert one record-aligned byte range of a CSV; runs in a pool process or Celery worker.
+# Continues from the chunk's last committed batch, so a retried or resumed chunk skips work already done.
+def import_chunk(job_id: str, csv_path: str, fieldnames: list[str], start: int, end: int):
+    db = SessionLocal()
+    try:
+        chunk = db.query(models.ImportChunk).filter(models.ImportChunk.job_id == job_id, models.ImportChunk.start == start).one()
+        chunk_id, offset = chunk.id, chunk.offset
+        rows = chunk.rows
+        processed = chunk.processed_rows
+        counts = Counter(inserted=chunk.inserted_rows, updated=chunk.updated_rows, unchanged=chunk.unchanged_rows)
+        if offset >= end:
+            return rows, processed, dict(counts)
+        reported_rows = processed
+        reported_bytes = offset
+        with open(csv_path, "rb") as f:
+            f.seek(offset)
+            lines = ByteLines(f, end - offset, start=offset)
+            reader = csv.DictReader(lines, fieldnames=fieldnames)
+            batch = ProductBatch()
+            record_start = offset
             for row in reader:
-                ok = _process_row(db, row)
-                if ok:
-                    batch += 1
+                rows += 1
+                # The record's byte offset orders it against the same SKU in other chunks
+                if batch.add(row, record_start):
                     processed += 1
-                if batch >= BATCH_SIZE:
-                    try:
-                        db.commit()
-                    except Exception as e:
-                        try:
-                            db.rollback()
-                        except Exception:
-                            pass
-                        _update_job(db, job_id, stage="failed", status="failed", error_message=str(e), finished_at=datetime.utcnow())
-                        logger.error(str(e))
-                        return
-                    batch = 0
-                    _update_job(db, job_id, processed_rows=processed)
-            if batch:
-                try:
-                    db.commit()
-                except Exception as e:
-                    try:
-                        db.rollback()
-                    except Exception:
-                        pass
-                    _update_job(db, job_id, stage="failed", status="failed", error_message=str(e), finished_at=datetime.utcnow())
-                    logger.error(str(e))
-                    return
-        _update_job(db, job_id, processed_rows=processed, stage="completed", status="completed", finished_at=datetime.utcnow())
-        # Notify webhooks
-        dispatch_event(db, "import.completed", {"job_id": job_id, "processed": processed, "total": total})
-    except Exception as e:
+                record_start = lines.consumed
+                if len(batch) >= BATCH_SIZE:
+                    written = _commit_chunk_batch(db, job_id, chunk_id, batch, counts, offset=lines.consumed, rows=rows, processed_rows=processed)
+                    progress.add(
+                        job_id,
+                        processed_rows=processed - reported_rows,
+                        processed_bytes=lines.consumed - reported_bytes,
+                        **_count_fields(written),
+                    )
+                    reported_rows, reported_bytes = processed, lines.consumed
+            written = _commit_chunk_batch(db, job_id, chunk_id, batch, counts, offset=end, rows=rows, processed_rows=processed)
+            progress.add(
+                job_id,
+                processed_rows=processed - reported_rows,
+                processed_bytes=end - reported_bytes,
+                **_count_fields(written),
+            )
+            # Pool processes and Celery workers may exit before the next timed flush
+            progress.flush(job_id)
+        return rows, processed, dict(counts)
+    except Exception:
         try:
             db.rollback()
         except Exception:
             pass
-        _update_job(db, job_id, stage="failed", status="failed", error_message=str(e), finished_at=datetime.utcnow())
-        logger.error(str(e))
+        raise
     finally:
         db.close()
 
+def _use_parallel(csv_path: str, mode: str) -> bool:
+    # Compressed files cannot be split into byte ranges
+    return (
+        mode == "batch"
+        and IMPORT_WORKERS > 1
+        and os.path.getsize(csv_path) >= IMPORT_PARALLEL_MIN_BYTES
+        and sniff_codec(csv_path) is None
+    )
+
+def _choose_path(db, job_id: str, csv_path: str, mode: str) -> str:
+    # "copy", "replace", "parallel" or "serial"; a resumed job continues the way it started.
+    # A replace commits nothing before its swap, so it always starts over
+    if db.query(models.ImportChunk.id).filter(models.ImportChunk.job_id == job_id).first() is not None:
+        return "parallel"
+    if _load_checkpoint(db, job_id) is not None:
+        if mode in ("copy", "replace"):
+            logger.info("Job %s has committed batches; resuming in batch mode", job_id)
+        return "serial"
+    if mode in ("copy", "replace"):
+        return mode
+    return "parallel" if _use_parallel(csv_path, mode) else "serial"
+
+def _plan_chunks(db, job_id: str, csv_path: str):
+    fieldnames, header_end = read_header(csv_path)
+    chunks = db.query(models.ImportChunk).filter(models.ImportChunk.job_id == job_id).order_by(models.ImportChunk.start).all()
+    if chunks:
+        # Resuming: keep the original ranges and restart the job's counters from what the chunks committed
+        ranges = [(c.start, c.end) for c in chunks]
+        _update_job(
+            db,
+            job_id,
+            stage="importing",
+            total_bytes=os.path.getsize(csv_path),
+            processed_bytes=header_end + sum(c.offset - c.start for c in chunks),
+            processed_rows=sum(c.processed_rows for c in chunks),
+            inserted_rows=sum(c.inserted_rows for c in chunks),
+            updated_rows=sum(c.updated_rows for c in chunks),
+            unchanged_rows=sum(c.unchanged_rows for c in chunks),
+        )
+        logger.info("Job %s: resuming %s chunks on %s workers", job_id, sum(c.offset < c.end for c in chunks), IMPORT_WORKERS)
+        return fieldnames, ranges
+    # A few chunks per worker evens out ranges that parse at different speeds
+    ranges = split_ranges(csv_path, header_end, IMPORT_WORKERS * 4)
+    write(db, lambda s: s.add_all([models.ImportChunk(job_id=job_id, start=a, end=b, offset=a) for a, b in ranges]))
+    _update_job(db, job_id, stage="importing", total_bytes=os.path.getsize(csv_path), processed_bytes=header_end)
+    logger.info("Job %s: importing %s chunks on %s workers", job_id, len(ranges), IMPORT_WORKERS)
+    return fieldnames, ranges
+
+def _import_parallel(db, job_id: str, csv_path: str):
+    fieldnames, ranges = _plan_chunks(db, job_id, csv_path)
+    # Spawned, not forked: a fork of this threaded process can copy a lock some other thread holds
+    with ProcessPoolExecutor(max_workers=max(1, IMPORT_WORKERS), mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(import_chunk, job_id, csv_path, fieldnames, a, b) for a, b in ranges]
+        try:
+            results = [f.result() for f in futures]
+        except Exception:
+            for f in futures:
+                f.cancel()
+            raise
+        finally:
+            # Chunk processes invalidated only their own local caches
+            invalidate_products()
+    return _sum_results(results)
+
+def _sum_results(results) -> tuple[int, int, Counter]:
+    # Chunk results are (rows, processed, counts); counts arrive as plain dicts from Celery
+    counts = Counter()
+    for r in results:
+        counts.update(r[2])
+    return sum(r[0] for r in results), sum(r[1] for r in results), counts
+
+def _check_header(db, job_id: str, fieldnames: list[str]) -> bool:
+    if "sku" not in [h.strip().lower() for h in fieldnames]:
+        _update_job(db, job_id, stage="failed", status="failed", error_message="CSV must include header 'sku'", finished_at=datetime.utcnow())
+        return False
+    return True
+
+def _start_import(db, job_id: str, csv_path: str):
+    # Marks the job running and validates the header; returns the header or None on failure
+    _update_job(db, job_id, stage="parsing", status="running", started_at=datetime.utcnow(), error_message=None, finished_at=None)
+    with open(csv_path, "rb") as f:
+        fieldnames = csv.DictReader(csv_lines(f)).fieldnames or []
+    return fieldnames if _check_header(db, job_id, fieldnames) else None
+
+def _finish_import(db, job_id: str, nbytes: int, total: int, processed: int, counts: Counter, timer: ImportTimer | None = None):
+    _update_job(
+        db,
+        job_id,
+        processed_rows=processed,
+        total_rows=total,
+        processed_bytes=nbytes,
+        total_bytes=nbytes,
+        stage="completed",
+        status="completed",
+        finished_at=datetime.utcnow(),
+        deleted_rows=counts["deleted"],
+        **_count_fields(counts),
+    )
+    # Notify webhooks
+    start = time.perf_counter()
+    dispatch_event(db, "import.completed", {"job_id": job_id, "processed": processed, "total": total, **{k: counts[k] for k in ("inserted", "updated", "unchanged", "deleted")}})
+    if timer:
+        timer.add("webhooks", time.perf_counter() - start)
+
+def _fail_import(db, job_id: str, e: Exception):
+    try:
+        db.rollback()
+    except Exception:
+        pass
+    _update_job(db, job_id, stage="failed", status="failed", error_message=str(e), finished_at=datetime.utcnow())
+    logger.error(str(e))
+
+def fail_job(job_id: str, message: str):
+    db = SessionLocal()
+    try:
+        _update_job(db, job_id, stage="failed", status="failed", error_message=message, finished_at=datetime.utcnow())
+    finally:
+        db.close()
+
+def requeue_job(job_id: str, stage: str = "queued"):
+    # Back in line after a failure; the checkpoint stays, so the next run continues from it
+    db = SessionLocal()
+    try:
+        _update_job(db, job_id, stage=stage, status="queued", finished_at=None)
+    finally:
+        db.close()
+
+def _resolve_mode(job_id: str, mode: str | None) -> str:
+    mode = (mode or IMPORT_MODE).lower()
+    if mode == "copy" and not DATABASE_URL.startswith("postgresql"):
+        logger.info("COPY import needs PostgreSQL; using batch mode for job %s", job_id)
+        mode = "batch"
+    if mode == "replace" and not DATABASE_URL.startswith(("postgresql", "sqlite")):
+        logger.info("Replace import needs PostgreSQL or SQLite; using batch mode for job %s", job_id)
+        mode = "batch"
+    return mode
+
+# Local background importer (FastAPI runtime). Picks up from the job's last checkpoint, if any.
+# Returns "completed", "failed" (the file was rejected) or "interrupted" (an error after the
+# import started; committed batches are kept and the job can be resumed).
+def import_csv_background(job_id: str, csv_path: str, mode: str | None = None) -> str:
+    mode = _resolve_mode(job_id, mode)
+    db = SessionLocal()
+    timer = ImportTimer(job_id)
+    status, rows = "failed", 0
+    try:
+        with timer.stage("header"):
+            fieldnames = _start_import(db, job_id, csv_path)
+        if fieldnames is None:
+            return "failed"
+        status = "interrupted"
+        path = _choose_path(db, job_id, csv_path, mode)
+        if path == "copy":
+            with timer.stage("copy"):
+                result = _import_copy(db, job_id, csv_path, fieldnames)
+        elif path == "replace":
+            result = _import_replace(db, job_id, csv_path, timer)
+        elif path == "parallel":
+            with timer.stage("chunks"):
+                result = _import_parallel(db, job_id, csv_path)
+        else:
+            result = _import_batches(db, job_id, csv_path, fieldnames, timer)
+        if result is None:
+            return status
+        total, processed, counts = result
+        _finish_import(db, job_id, os.path.getsize(csv_path), total, processed, counts, timer)
+        status, rows = "completed", total
+    except Exception as e:
+        _fail_import(db, job_id, e)
+    finally:
+        timer.finish("completed" if status == "completed" else "failed", rows)
+        db.close()
+    return status
+
+# Streaming importer: parses a binary stream (e.g. an upload still in flight) as it arrives
+def import_csv_stream(job_id: str, raw, total_bytes: int = 0):
+    db = SessionLocal()
+    timer = ImportTimer(job_id)
+    status, rows = "failed", 0
+    try:
+        _update_job(db, job_id, stage="parsing", status="running", started_at=datetime.utcnow(), total_bytes=total_bytes)
+        lines = csv_lines(raw)
+        reader = csv.DictReader(lines)
+        if not _check_header(db, job_id, reader.fieldnames or []):
+            return
+        _update_job(db, job_id, stage="importing")
+        result = _import_rows(db, job_id, lines, reader, timer)
+        if result is None:
+            return
+        total, processed, counts = result
+        _finish_import(db, job_id, lines.progress, total, processed, counts, timer)
+        status, rows = "completed", total
+    except Exception as e:
+        _fail_import(db, job_id, e)
+    finally:
+        timer.finish(status, rows)
+        db.close()
+
+def _retry_delay(retries: int) -> float:
+    return IMPORT_RETRY_BACKOFF_SECS * 2 ** retries
+
 # Celery task wrapper
 try:
+    from celery import chord
     from .celery_app import celery
-    @celery.task(name="import_csv_task")
-    def import_csv_task(job_id: str, csv_path: str):
-        import_csv_background(job_id, csv_path)
+
+    # acks_late + reject_on_worker_lost: a worker killed mid-import gets its task redelivered,
+    # and the redelivered task resumes from the job's checkpoint instead of starting over
+    @celery.task(name="import_csv_task", bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=IMPORT_MAX_RETRIES)
+    def import_csv_task(self, job_id: str, csv_path: str, mode: str | None = None):
+        mode = _resolve_mode(job_id, mode)
+        db = SessionLocal()
+        try:
+            job = db.get(models.JobProgress, job_id)
+            if job is None or job.status == "completed":
+                # Redelivered after the import had already finished
+                return
+            path = _choose_path(db, job_id, csv_path, mode)
+        finally:
+            db.close()
+        if path != "parallel":
+            if import_csv_background(job_id, csv_path, mode) == "interrupted" and self.request.retries < self.max_retries:
+                requeue_job(job_id, stage="retrying")
+                raise self.retry(countdown=_retry_delay(self.request.retries))
+            return
+        # Fan the chunks out across workers; the chord callback completes the job
+        db = SessionLocal()
+        try:
+            if _start_import(db, job_id, csv_path) is None:
+                return
+            fieldnames, ranges = _plan_chunks(db, job_id, csv_path)
+        except Exception as e:
+            _fail_import(db, job_id, e)
+            return
+        finally:
+            db.close()
+        chord(
+            import_chunk_task.s(job_id, csv_path, fieldnames, a, b) for a, b in ranges
+        )(finish_import_task.s(job_id, csv_path))
+
+    @celery.task(name="import_chunk_task", bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=IMPORT_MAX_RETRIES)
+    def import_chunk_task(self, job_id: str, csv_path: str, fieldnames: list[str], start: int, end: int):
+        try:
+            return import_chunk(job_id, csv_path, fieldnames, start, end)
+        except Exception as e:
+            if self.request.retries < self.max_retries:
+                # The retry continues from the chunk's last committed batch
+                logger.warning("Job %s: chunk at %s failed, retrying: %s", job_id, start, e)
+                raise self.retry(exc=e, countdown=_retry_delay(self.request.retries))
+            db = SessionLocal()
+            try:
+                _fail_import(db, job_id, e)
+            finally:
+                db.close()
+            raise
+
+    @celery.task(name="finish_import_task")
+    def finish_import_task(results, job_id: str, csv_path: str):
+        db = SessionLocal()
+        try:
+            total, processed, counts = _sum_results(results)
+            _finish_import(db, job_id, os.path.getsize(csv_path), total, processed, counts)
+        except Exception as e:
+            _fail_import(db, job_id, e)
+        finally:
+            db.close()
 except Exception:
     # Celery not available in local preview
-    pass
\ No newline at end of file
+    pass
@@ -1,49 +1,267 @@
+import os
+import json
 import time
+import random
+import asyncio
 import logging
+import threading
+from datetime import datetime
+from urllib.parse import urlsplit
+
 import httpx
+from sqlalchemy import update
+
 from . import models
+from .database import SessionLocal
+from .writer import write
+from .metrics import WEBHOOK_DELIVERIES_IN_FLIGHT
+
+TIMEOUT_SECS = float(os.getenv("WEBHOOK_TIMEOUT_SECS", "10"))
+# Attempts per delivery; retries back off exponentially from WEBHOOK_BACKOFF_SECS, with jitter
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_BACKOFF_SECS = float(os.getenv("WEBHOOK_BACKOFF_SECS", "1"))
+WEBHOOK_MAX_BACKOFF_SECS = float(os.getenv("WEBHOOK_MAX_BACKOFF_SECS", "60"))
+# Requests in flight per receiving host, and connections in the shared client pool
+WEBHOOK_PER_HOST = int(os.getenv("WEBHOOK_PER_HOST", "4"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "100"))
+# Delivery outcomes are buffered and written to the DB at most this often
+WEBHOOK_FLUSH_SECS = float(os.getenv("WEBHOOK_FLUSH_SECS", "1"))
+USE_CELERY = os.getenv("USE_CELERY", "false").lower() == "true"
+RETRY_STATUS = {408, 425, 429}
 
-TIMEOUT_SECS = 10
 logger = logging.getLogger("app.webhooks")
+# Deliveries still pending from before this time were left by an earlier process
+_STARTED_AT = datetime.utcnow()
 
-def dispatch_event(db, event: str, payload: dict):
-    items = db.query(models.Webhook).filter(models.Webhook.enabled == True, models.Webhook.event == event).all()
-    for w in items:
-        try:
-            start = time.time()
-            r = httpx.post(w.url, json={"event": event, "payload": payload}, timeout=TIMEOUT_SECS)
-            w.last_status_code = r.status_code
-            w.last_response_ms = int((time.time() - start) * 1000)
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=TIMEOUT_SECS,
+        limits=httpx.Limits(max_connections=WEBHOOK_MAX_CONNECTIONS, max_keepalive_connections=WEBHOOK_MAX_CONNECTIONS),
+    )
+
+def _backoff(attempt: int) -> float:
+    delay = min(WEBHOOK_MAX_BACKOFF_SECS, WEBHOOK_BACKOFF_SECS * 2 ** (attempt - 1))
+    return delay / 2 + random.random() * delay / 2
+
+def _retryable(code: int) -> bool:
+    return code == -1 or code >= 500 or code in RETRY_STATUS
+
+async def _deliver(client: httpx.AsyncClient, hosts: dict, item: dict, record):
+    host = urlsplit(item["url"]).netloc
+    sem = hosts.get(host)
+    if sem is None:
+        sem = hosts[host] = asyncio.Semaphore(WEBHOOK_PER_HOST)
+    headers = {"Content-Type": "application/json", "X-Webhook-Delivery": str(item["id"])}
+    code, ms, error, attempt = -1, None, None, 0
+    while attempt < WEBHOOK_MAX_ATTEMPTS:
+        attempt += 1
+        async with sem:
+            start = time.perf_counter()
             try:
-                db.commit()
+                r = await client.post(item["url"], content=item["body"], headers=headers)
+                code, ms, error = r.status_code, int((time.perf_counter() - start) * 1000), None
             except Exception as e:
-                try:
-                    db.rollback()
-                except Exception:
-                    pass
-                logger.error(str(e))
+                code, ms, error = -1, None, str(e) or type(e).__name__
+        if not _retryable(code) or attempt == WEBHOOK_MAX_ATTEMPTS:
+            break
+        # Back off outside the host slot so other deliveries to the host keep moving
+        await asyncio.sleep(_backoff(attempt))
+    if code == -1:
+        logger.error(f"Webhook {item['webhook_id']} delivery {item['id']} failed: {error}")
+    record({
+        "id": item["id"],
+        "webhook_id": item["webhook_id"],
+        "status": "delivered" if 200 <= code < 400 else "failed",
+        "attempts": attempt,
+        "status_code": code,
+        "response_ms": ms,
+        "error": error,
+        "finished_at": datetime.utcnow(),
+    })
+
+async def _deliver_all(client: httpx.AsyncClient, hosts: dict, items: list[dict], record):
+    await asyncio.gather(*(_deliver(client, hosts, item, record) for item in items))
+
+def _record_results(results: list[dict]):
+    # One executemany for the delivery log and one for the webhooks' last status
+    db = SessionLocal()
+    try:
+        write(db, _save_results, results)
+    except Exception as e:
+        try:
+            db.rollback()
+        except Exception:
+            pass
+        logger.error(str(e))
+    finally:
+        db.close()
+
+def _save_results(db, results: list[dict]):
+    latest = {}
+    for r in results:
+        latest[r["webhook_id"]] = {"id": r["webhook_id"], "last_status_code": r["status_code"], "last_response_ms": r["response_ms"]}
+    db.execute(update(models.WebhookDelivery), [{k: v for k, v in r.items() if k != "webhook_id"} for r in results])
+    existing = {i for (i,) in db.query(models.Webhook.id).filter(models.Webhook.id.in_(latest))}
+    if existing:
+        db.execute(update(models.Webhook), [v for k, v in latest.items() if k in existing])
+
+async def deliver_batch(items: list[dict]):
+    # Standalone run (Celery task): own client, then a single write of every outcome
+    results: list[dict] = []
+    async with _new_client() as client:
+        await _deliver_all(client, {}, items, results.append)
+    _record_results(results)
+
+class DeliveryQueue:
+    """Sends webhook deliveries from a background event loop.
+
+    ``submit`` may be called from any thread and returns immediately. All deliveries share one
+    ``httpx.AsyncClient`` connection pool and one semaphore per receiving host; outcomes are
+    buffered and flushed to the DB every WEBHOOK_FLUSH_SECS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+        self._results: list[dict] = []
+        self._inflight: set = set()
+
+    def submit(self, items: list[dict]):
+        if items:
+            asyncio.run_coroutine_threadsafe(self._run(items), self._ensure_loop())
+
+    def shutdown(self, timeout: float = 10):
+        # Wait up to timeout for in-flight deliveries, then write whatever finished
+        if self._loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._drain(timeout), self._loop).result(timeout + 5)
         except Exception as e:
-            w.last_status_code = -1
-            w.last_response_ms = None
+            logger.error(f"Webhook queue shutdown: {e}")
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="webhook-delivery", daemon=True).start()
+                asyncio.run_coroutine_threadsafe(self._flush_forever(), loop)
+                self._loop = loop
+            return self._loop
+
+    async def _run(self, items: list[dict]):
+        if self._client is None:
+            self._client = _new_client()
+        task = asyncio.current_task()
+        self._inflight.add(task)
+        WEBHOOK_DELIVERIES_IN_FLIGHT.inc(len(items))
+        try:
+            await _deliver_all(self._client, self._hosts, items, self._record)
+        finally:
+            self._inflight.discard(task)
+            WEBHOOK_DELIVERIES_IN_FLIGHT.dec(len(items))
+
+    def _record(self, result: dict):
+        self._results.append(result)
+
+    async def _flush(self):
+        if not self._results:
+            return
+        results, self._results = self._results, []
+        await asyncio.get_running_loop().run_in_executor(None, _record_results, results)
+
+    async def _flush_forever(self):
+        while True:
+            await asyncio.sleep(WEBHOOK_FLUSH_SECS)
             try:
-                db.commit()
-            except Exception as e2:
-                try:
-                    db.rollback()
-                except Exception:
-                    pass
-                logger.error(str(e2))
+                await self._flush()
+            except Exception as e:
+                logger.error(str(e))
+
+    async def _drain(self, timeout: float):
+        if self._inflight:
+            await asyncio.wait(set(self._inflight), timeout=timeout)
+        await self._flush()
 
+deliveries = DeliveryQueue()
 
-def test_webhook(w: models.Webhook):
+def dispatch_event(db, event: str, payload: dict):
+    # Logs one pending delivery per subscriber and hands them to the delivery queue; never waits on HTTP
+    try:
+        items = write(db, _log_deliveries, event, json.dumps({"event": event, "payload": payload}, default=str))
+    except Exception as e:
+        try:
+            db.rollback()
+        except Exception:
+            pass
+        logger.error(str(e))
+        return
+    _send(items)
+
+def _send(items: list[dict]):
+    if not items:
+        return
+    if USE_CELERY and deliver_webhooks_task is not None:
+        deliver_webhooks_task.delay(items)
+    else:
+        deliveries.submit(items)
+
+def resume_pending(batch_size: int = 1000) -> int:
+    # Re-sends deliveries an earlier process logged but stopped before recording; returns how many
+    d, w = models.WebhookDelivery, models.Webhook
+    db = SessionLocal()
+    resumed = 0
+    try:
+        last_id = 0
+        while True:
+            rows = (
+                db.query(d.id, d.webhook_id, w.url, d.payload)
+                .join(w, w.id == d.webhook_id)
+                .filter(d.status == "pending", d.created_at < _STARTED_AT, d.id > last_id)
+                .order_by(d.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            _send([{"id": r.id, "webhook_id": r.webhook_id, "url": r.url, "body": r.payload} for r in rows])
+            resumed += len(rows)
+            last_id = rows[-1].id
+    except Exception as e:
+        logger.error(str(e))
+    finally:
+        db.close()
+    return resumed
+
+def _log_deliveries(db, event: str, body: str) -> list[dict]:
+    hooks = db.query(models.Webhook).filter(models.Webhook.enabled == True, models.Webhook.event == event).all()
+    if not hooks:
+        return []
+    rows = [models.WebhookDelivery(webhook_id=w.id, event=event, payload=body) for w in hooks]
+    db.add_all(rows)
+    db.flush()
+    return [{"id": d.id, "webhook_id": w.id, "url": w.url, "body": body} for d, w in zip(rows, hooks)]
+
+async def test_webhook(w: models.Webhook) -> dict:
+    # The caller stores status_code / response_ms on the webhook; a connection error is status -1
     try:
         start = time.time()
-        r = httpx.post(w.url, json={"event": w.event, "payload": {"test": True}}, timeout=TIMEOUT_SECS)
-        w.last_status_code = r.status_code
-        w.last_response_ms = int((time.time() - start) * 1000)
-        return {"status_code": r.status_code, "response_ms": w.last_response_ms}
+        async with httpx.AsyncClient(timeout=TIMEOUT_SECS) as client:
+            r = await client.post(w.url, json={"event": w.event, "payload": {"test": True}})
+        return {"status_code": r.status_code, "response_ms": int((time.time() - start) * 1000)}
     except Exception as e:
-        w.last_status_code = -1
-        w.last_response_ms = None
         logger.error(str(e))
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+# Celery task wrapper: deliveries run on the worker pool instead of inside the import task
+deliver_webhooks_task = None
+try:
+    from .celery_app import celery
+
+    @celery.task(name="deliver_webhooks_task")
+    def deliver_webhooks_task(items: list[dict]):
+        asyncio.run(deliver_batch(items))
+except Exception:
+    # Celery not available in local preview
+    pass
@@ -0,0 +1,160 @@
+import os
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from .database import SQLITE_WRITER, engine
+
+# Most queued writes committed together in one transaction
+WRITER_MAX_BATCH = int(os.getenv("WRITER_MAX_BATCH", "64"))
+
+class SQLiteWriter:
+    """Runs a process's SQLite writes on one thread that owns the only write connection.
+
+    ``submit(fn, *args)`` queues ``fn(db, *args)``, with ``db`` the writer's Session, and returns
+    a Future. The thread takes whatever is queued (up to ``max_batch`` calls), opens one
+    ``BEGIN IMMEDIATE`` transaction, runs each call in a SAVEPOINT so a failing call is rolled
+    back alone, and commits once. Futures resolve only after that commit. Calls must not commit
+    themselves; one that submits from inside the writer runs in the current transaction.
+    ``alone=True`` gives a large write (an import batch) a transaction of its own, so small
+    writes queued around it are not held until it commits.
+    """
+
+    def __init__(self, max_batch: int = WRITER_MAX_BATCH):
+        self.max_batch = max(1, max_batch)
+        self._reset()
+
+    def _reset(self):
+        # Also runs in forked children: the parent's thread and connection do not exist there
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._db: Session | None = None
+        self._closed = False
+
+    def submit(self, fn: Callable, *args, alone: bool = False) -> Future:
+        future: Future = Future()
+        if threading.current_thread() is self._thread:
+            future.set_running_or_notify_cancel()
+            future.set_result(fn(self._db, *args))
+            return future
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("SQLite writer is shutting down")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((fn, args, future, alone))
+        return future
+
+    def run(self, fn: Callable, *args, alone: bool = False):
+        return self.submit(fn, *args, alone=alone).result()
+
+    async def arun(self, fn: Callable, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def shutdown(self, timeout: float = 10):
+        # Commits what is already queued; a later submit starts a new thread
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+            if thread.is_alive():
+                return
+        with self._lock:
+            self._thread = None
+            self._closed = False
+
+    def _run(self):
+        conn = engine.connect()
+        self._db = Session(bind=conn, autoflush=False, expire_on_commit=False)
+        try:
+            stop = False
+            held = None
+            while not stop:
+                item, held = held or self._queue.get(), None
+                if item is None:
+                    break
+                group = [item]
+                while not item[3] and len(group) < self.max_batch:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    if item[3]:
+                        # Commits what was gathered so far; the large write goes next, by itself
+                        held = item
+                        break
+                    group.append(item)
+                self._commit(group)
+            if held is not None:
+                self._commit([held])
+        finally:
+            self._db.close()
+            conn.close()
+
+    def _commit(self, group: list):
+        db = self._db
+        group = [item for item in group if item[2].set_running_or_notify_cancel()]
+        outcomes = []
+        try:
+            if not group:
+                return
+            # pysqlite only opens a transaction before DML; take the write lock for the whole group now
+            db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+            if len(group) == 1:
+                fn, args, future, _ = group[0]
+                outcomes.append((future, True, fn(db, *args)))
+            else:
+                for fn, args, future, _ in group:
+                    try:
+                        with db.begin_nested():
+                            outcomes.append((future, True, fn(db, *args)))
+                    except Exception as e:
+                        outcomes.append((future, False, e))
+            db.commit()
+        except Exception as e:
+            # A lone call's own error, or the commit failed: nothing in the group was written
+            try:
+                db.rollback()
+            except Exception:
+                pass
+            for _, _, future, _ in group:
+                future.set_exception(e)
+            return
+        finally:
+            # Rows read in this transaction may be changed by other processes before the next one
+            db.expunge_all()
+        for future, ok, value in outcomes:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+writer = SQLiteWriter() if SQLITE_WRITER else None
+if writer is not None and hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=writer._reset)
+
+def write(db, fn: Callable, *args):
+    """Run ``fn(session, *args)`` and commit: on the writer thread when it is enabled, else on ``db``.
+
+    ``db`` is committed either way, which ends its read transaction so it sees the write.
+    """
+    result = writer.run(fn, *args) if writer is not None else fn(db, *args)
+    db.commit()
+    return result
+
+async def awrite(db, fn: Callable, *args):
+    # write() for async routes; without the writer ``fn`` runs on the AsyncSession's sync facade
+    result = await writer.arun(fn, *args) if writer is not None else await db.run_sync(fn, *args)
+    await db.commit()
+    return result
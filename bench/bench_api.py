@@ -0,0 +1,244 @@
+"""API load test: requests/sec and latency percentiles per endpoint against a seeded database.
+
+Usage: python -m bench.bench_api [--scenario list get crud job sse webhooks] [--concurrency 16 64]
+                                 [--seconds 10] [--products 10000] [--page-size 100] [--cache-ttl 0]
+                                 [--workers 1] [--db sqlite] [--out report.json] [--compare baseline.json]
+
+Seeds products, webhooks and completed jobs into a fresh SQLite file (or --db, a scratch
+database: its products, webhooks and jobs are replaced), starts uvicorn with app.main:app in
+a subprocess and drives each scenario with ``concurrency`` simultaneous httpx clients:
+
+- ``list``: GET /products?page_size=N on random pages of the first ten
+- ``get``: GET /products/{id}
+- ``crud``: POST /products, PUT /products/{id} and DELETE /products/{id} of a new SKU
+- ``job``: GET /jobs/{id}
+- ``sse``: GET /jobs/{id}/events of a completed job (one event, then the stream ends)
+- ``webhooks``: GET /webhooks
+
+The product cache is off by default (``--cache-ttl 0``) so every request reaches the database.
+The client shares the machine with the server, so run it on more than one core. The JSON
+report is tagged with the git commit; --compare prints ratios against an earlier report.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("list", "get", "crud", "job", "sse", "webhooks")
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+def seed(products: int, webhooks: int = 50, jobs: int = 100) -> dict:
+    # Runs in a subprocess so the app modules pick up this run's DATABASE_URL
+    from datetime import datetime
+    from app.database import SessionLocal, init_db
+    from app.bulk import upsert_products
+    from app import models
+
+    init_db()
+    db = SessionLocal()
+    try:
+        for model in (models.Product, models.WebhookDelivery, models.Webhook, models.JobProgress):
+            db.query(model).delete()
+        for start in range(0, products, 5000):
+            rows = [
+                {"sku": f"SKU-{i}", "sku_lower": f"sku-{i}", "name": f"Product {i}", "description": f"Description for product {i}"}
+                for i in range(start, min(start + 5000, products))
+            ]
+            upsert_products(db, rows)
+        # Disabled, so the CRUD scenario's writes never dispatch deliveries
+        db.add_all([models.Webhook(url=f"https://example.com/hook/{i}", enabled=False) for i in range(webhooks)])
+        now = datetime.utcnow()
+        job_ids = [uuid.uuid4().hex for _ in range(jobs)]
+        db.add_all([
+            models.JobProgress(
+                id=j, stage="completed", status="completed", processed_rows=1000, total_rows=1000,
+                inserted_rows=1000, started_at=now, finished_at=now,
+            )
+            for j in job_ids
+        ])
+        db.commit()
+        return {"product_ids": [r[0] for r in db.query(models.Product.id)], "job_ids": job_ids}
+    finally:
+        db.close()
+
+async def _timed(client, method: str, url: str, latencies: list[float], **kwargs):
+    start = time.perf_counter()
+    try:
+        r = await client.request(method, url, **kwargs)
+        ok = r.status_code == 200
+    except Exception:
+        r, ok = None, False
+    if ok:
+        latencies.append(time.perf_counter() - start)
+    return r if ok else None
+
+async def load(base: str, scenario: str, concurrency: int, seconds: float, data: dict, page_size: int) -> dict:
+    import httpx
+
+    latencies: list[float] = []
+    attempts = 0
+    deadline = time.perf_counter() + seconds
+    run = uuid.uuid4().hex[:8]
+    serial = itertools.count()
+
+    async def step(client, rnd: random.Random) -> int:
+        # One scenario iteration; returns how many requests it attempted
+        if scenario == "list":
+            await _timed(client, "GET", f"/products?page_size={page_size}&page={rnd.randint(1, 10)}", latencies)
+        elif scenario == "get":
+            await _timed(client, "GET", f"/products/{rnd.choice(data['product_ids'])}", latencies)
+        elif scenario == "job":
+            await _timed(client, "GET", f"/jobs/{rnd.choice(data['job_ids'])}", latencies)
+        elif scenario == "sse":
+            await _timed(client, "GET", f"/jobs/{rnd.choice(data['job_ids'])}/events", latencies)
+        elif scenario == "webhooks":
+            await _timed(client, "GET", "/webhooks", latencies)
+        else:
+            sku = f"LOAD-{run}-{next(serial)}"
+            r = await _timed(client, "POST", "/products", latencies, json={"sku": sku, "name": "load test"})
+            if r is None:
+                return 1
+            product_id = r.json()["id"]
+            await _timed(client, "PUT", f"/products/{product_id}", latencies, json={"name": "load test 2"})
+            await _timed(client, "DELETE", f"/products/{product_id}", latencies)
+            return 3
+        return 1
+
+    async def worker(client, rnd: random.Random):
+        nonlocal attempts
+        while time.perf_counter() < deadline:
+            n = await step(client, rnd)
+            attempts += n
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client, random.Random(i)) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": attempts - len(latencies),
+        "req_per_sec": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+def _key(r: dict) -> tuple:
+    return (r["scenario"], r["concurrency"])
+
+def compare(report: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = {_key(r): r for r in json.load(f)["results"]}
+    print(f"vs {baseline_path}:", file=sys.stderr)
+    for r in report["results"]:
+        old = baseline.get(_key(r))
+        if not old or not old["req_per_sec"] or not r["req_per_sec"]:
+            continue
+        print(
+            f"  {r['scenario']:>8} c={r['concurrency']:<4}: {r['req_per_sec'] / old['req_per_sec']:6.2f}x req/s, "
+            f"{r['p50_ms'] / old['p50_ms']:6.2f}x p50, {r['p99_ms'] / old['p99_ms']:6.2f}x p99",
+            file=sys.stderr,
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="API load test")
+    parser.add_argument("--scenario", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[16, 64])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--cache-ttl", default="0", help="PRODUCT_CACHE_TTL for the server")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--db", default="sqlite", help="'sqlite' (fresh temp file) or a scratch database URL")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    parser.add_argument("--seed", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.seed:
+        print(json.dumps(seed(args.products)))
+        return
+
+    import httpx
+
+    if args.db == "sqlite":
+        db_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_api_'), 'bench.db')}"
+    else:
+        db_url = args.db
+    env = dict(os.environ, DATABASE_URL=db_url, PRODUCT_CACHE_TTL=args.cache_ttl)
+    seeded = subprocess.run(
+        [sys.executable, "-m", "bench.bench_api", "--seed", "1", "--products", str(args.products)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    data = json.loads(seeded.stdout.strip().splitlines()[-1])
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(args.workers),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT, env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    results = []
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"{base}/webhooks")
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        print(f"products={args.products} page_size={args.page_size} seconds={args.seconds} db={db_url.split(':')[0]}", file=sys.stderr)
+        for scenario in args.scenario:
+            for concurrency in args.concurrency:
+                r = asyncio.run(load(base, scenario, concurrency, args.seconds, data, args.page_size))
+                results.append(r)
+                print(
+                    f"{scenario:>8} c={concurrency:<4}: {r['req_per_sec']:>8,.0f} req/s  p50 {r['p50_ms']:>7.1f} ms"
+                    f"  p95 {r['p95_ms']:>7.1f} ms  p99 {r['p99_ms']:>7.1f} ms  errors {r['errors']}",
+                    file=sys.stderr,
+                )
+    finally:
+        server.terminate()
+        server.wait()
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "params": {k: getattr(args, k) for k in ("products", "page_size", "cache_ttl", "workers", "seconds")},
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Requests/sec and latency percentiles of the sync (threadpool) and async database paths under load.
+
+Usage: python -m bench.bench_async [concurrency ...] [--seconds 10] [--products 10000]
+
+Seeds a fresh SQLite file (or DATABASE_URL if set), starts uvicorn with ``bench_app`` in a
+subprocess and drives it with ``concurrency`` simultaneous httpx clients. ``bench_app`` serves
+the same two queries as GET /products/{id} and GET /products (a page plus its count), once as
+``def`` routes on SessionLocal and once as ``async def`` routes on AsyncSessionLocal, with the
+product cache out of the way. The client shares the machine, so run it on more than one core.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+if not os.getenv("DATABASE_URL"):
+    _tmp = tempfile.mkdtemp(prefix="bench_async_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI, HTTPException  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.database import SessionLocal, get_async_db, get_db, init_db  # noqa: E402
+from app.bulk import upsert_products  # noqa: E402
+from app.schemas import ProductOut  # noqa: E402
+from app import models  # noqa: E402
+
+PAGE = select(models.Product).order_by(models.Product.id.desc()).limit(20)
+COUNT = select(func.count()).select_from(models.Product)
+
+bench_app = FastAPI()
+
+@bench_app.get("/sync/products/{product_id}")
+def sync_get(product_id: int, db: Session = Depends(get_db)):
+    p = db.get(models.Product, product_id)
+    if not p:
+        raise HTTPException(status_code=404)
+    return ProductOut.model_validate(p)
+
+@bench_app.get("/async/products/{product_id}")
+async def async_get(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    p = await db.get(models.Product, product_id)
+    if not p:
+        raise HTTPException(status_code=404)
+    return ProductOut.model_validate(p)
+
+@bench_app.get("/sync/products")
+def sync_list(db: Session = Depends(get_db)):
+    return {"total": db.scalar(COUNT), "items": [ProductOut.model_validate(p) for p in db.scalars(PAGE)]}
+
+@bench_app.get("/async/products")
+async def async_list(db: AsyncSession = Depends(get_async_db)):
+    return {"total": await db.scalar(COUNT), "items": [ProductOut.model_validate(p) for p in await db.scalars(PAGE)]}
+
+def seed(n: int):
+    init_db()
+    db = SessionLocal()
+    try:
+        db.query(models.Product).delete()
+        for start in range(0, n, 5000):
+            rows = [
+                {"sku": f"SKU-{i}", "sku_lower": f"sku-{i}", "name": f"Product {i}", "description": f"Description {i}"}
+                for i in range(start, min(start + 5000, n))
+            ]
+            upsert_products(db, rows)
+        db.commit()
+        return [r[0] for r in db.query(models.Product.id)]
+    finally:
+        db.close()
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def load(base: str, paths: list[str], concurrency: int, seconds: float) -> tuple[float, list[float], int]:
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+
+    async def worker(client: httpx.AsyncClient, rnd: random.Random):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                r = await client.get(rnd.choice(paths))
+                ok = r.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client, random.Random(i)) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies, errors
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("concurrency", nargs="*", type=int, default=[16, 64, 256])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--products", type=int, default=10_000)
+    args = parser.parse_args()
+    ids = seed(args.products)
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bench.bench_async:bench_app", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        env=dict(os.environ, PRODUCT_CACHE_TTL="0"),
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"{base}/sync/products")
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        sample = random.Random(1).sample(ids, min(len(ids), 1000))
+        print(f"products={args.products} seconds={args.seconds} db={os.environ['DATABASE_URL'].split(':')[0]}")
+        for concurrency in args.concurrency:
+            for path in ("sync", "async"):
+                # Three id lookups per page listing
+                paths = [f"/{path}/products/{i}" for i in sample] * 3 + [f"/{path}/products"] * len(sample)
+                elapsed, latencies, errors = asyncio.run(load(base, paths, concurrency, args.seconds))
+                print(
+                    f"c={concurrency:<4} {path:>5}: {len(latencies) / elapsed:>8,.0f} req/s"
+                    f"  p50 {percentile(latencies, 0.5) * 1000:>7.1f} ms  p99 {percentile(latencies, 0.99) * 1000:>7.1f} ms"
+                    f"  errors {errors}"
+                )
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Rows/sec of POST /products/bulk (NDJSON and JSON array) vs a CSV import of the same rows.
+
+Usage: python -m bench.bench_bulk [rows]
+
+Runs in-process through TestClient against a fresh SQLite file (or DATABASE_URL if set).
+Each variant imports into an empty table ("new") and then repeats the same write ("unchanged").
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+import orjson
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+_tmp = tempfile.mkdtemp(prefix="bench_bulk_")
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.database import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app import models, tasks  # noqa: E402
+
+def rows(n: int) -> list[dict]:
+    return [{"sku": f"SKU-{i}", "name": f"Product {i}", "description": f"Description for product {i}"} for i in range(n)]
+
+def write_csv(path: str, items: list[dict]):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("sku,name,description\n")
+        for r in items:
+            f.write(f"{r['sku']},{r['name']},{r['description']}\n")
+
+def csv_import(client: TestClient, csv_path: str):
+    job_id = uuid.uuid4().hex
+    db = SessionLocal()
+    db.add(models.JobProgress(id=job_id))
+    db.commit()
+    db.close()
+    tasks.import_csv_background(job_id, csv_path)
+
+def bulk(client: TestClient, body: bytes, content_type: str):
+    r = client.post("/products/bulk", content=body, headers={"content-type": content_type})
+    assert r.status_code == 200, r.text
+    assert b'"error"' not in r.content
+
+def timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return ROWS / (time.perf_counter() - start)
+
+def main():
+    items = rows(ROWS)
+    csv_path = os.path.join(_tmp, "catalog.csv")
+    write_csv(csv_path, items)
+    ndjson = b"\n".join(orjson.dumps(r) for r in items)
+    array = orjson.dumps(items)
+    print(f"rows={ROWS} batch={tasks.BATCH_SIZE}")
+    with TestClient(app) as client:
+        variants = (
+            ("csv import", csv_import, (client, csv_path)),
+            ("bulk ndjson", bulk, (client, ndjson, "application/x-ndjson")),
+            ("bulk array", bulk, (client, array, "application/json")),
+        )
+        for label, fn, args in variants:
+            client.delete("/products")
+            new = timed(fn, *args)
+            unchanged = timed(fn, *args)
+            print(f"{label:>12}: new {new:>10,.0f} rows/s   unchanged {unchanged:>10,.0f} rows/s")
+
+if __name__ == "__main__":
+    main()
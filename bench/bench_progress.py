@@ -0,0 +1,99 @@
+"""Import rows/sec with job progress writes off, on every batch, and coalesced.
+
+Usage: python -m bench.bench_progress [rows] [batch_size]
+
+Runs a chunked import (the code path of parallel workers, which write progress deltas after
+every batch) in this process against a fresh SQLite file (or DATABASE_URL if set). Every run
+starts from an empty products table with its own SKUs, so each row is an insert rather than
+the skip-unchanged path of a re-import. Small batches make progress reports frequent, which
+is where per-batch writes hurt.
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+BATCH = sys.argv[2] if len(sys.argv) > 2 else "250"
+REPEAT = 3
+
+os.environ["IMPORT_BATCH_SIZE"] = BATCH
+_tmp = tempfile.mkdtemp(prefix="bench_progress_")
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+
+from app.database import SessionLocal, init_db  # noqa: E402
+from app import models, tasks  # noqa: E402
+from app.progress import progress, ProgressWriter  # noqa: E402
+
+class NoProgress(ProgressWriter):
+    def set(self, job_id, **fields):
+        pass
+
+    def add(self, job_id, **deltas):
+        pass
+
+    def publish(self, job_id):
+        pass
+
+def write_csv(path: str, n: int, prefix: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("sku,name,description\n")
+        for i in range(n):
+            f.write(f"{prefix}-{i},Product {i},Description for product {i}\n")
+
+def reset():
+    db = SessionLocal()
+    try:
+        for model in (models.Product, models.ImportChunk, models.JobProgress):
+            db.query(model).delete()
+        db.commit()
+    finally:
+        db.close()
+
+def run(writer: ProgressWriter) -> float:
+    reset()
+    job_id = uuid.uuid4().hex
+    csv_path = os.path.join(_tmp, "catalog.csv")
+    write_csv(csv_path, ROWS, job_id[:8])
+    tasks.progress = writer
+    db = SessionLocal()
+    try:
+        db.add(models.JobProgress(id=job_id))
+        db.commit()
+        fieldnames, ranges = tasks._plan_chunks(db, job_id, csv_path)
+        start = time.perf_counter()
+        results = [tasks.import_chunk(job_id, csv_path, fieldnames, a, b) for a, b in ranges]
+        writer.flush(job_id)
+        elapsed = time.perf_counter() - start
+        _, processed, counts = tasks._sum_results(results)
+        assert processed == ROWS and counts["inserted"] == ROWS, counts
+        if writer is progress:
+            db.expire_all()
+            assert db.get(models.JobProgress, job_id).processed_rows == ROWS
+    finally:
+        db.close()
+    return ROWS / elapsed
+
+def main():
+    init_db()
+    # Four chunks, run one after another here
+    tasks.IMPORT_WORKERS = 1
+    print(f"rows={ROWS} batch={BATCH} ({ROWS // int(BATCH)} progress reports per import)")
+    variants = (
+        ("off", NoProgress(), 0),
+        ("every batch", progress, 0),
+        ("coalesced", progress, 0.5),
+    )
+    rates = {label: [] for label, _, _ in variants}
+    # Interleaved, so a database that slows down over the runs does not favour one variant
+    for _ in range(REPEAT):
+        for label, writer, interval in variants:
+            writer.interval = interval
+            rates[label].append(run(writer))
+    for label, _, _ in variants:
+        print(f"{label:>12}: {max(rates[label]):>10,.0f} rows/s (best of {REPEAT})")
+
+if __name__ == "__main__":
+    main()
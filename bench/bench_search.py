@@ -0,0 +1,89 @@
+"""Time GET /products name/description searches: ILIKE scans vs the search index.
+
+Usage: python -m bench.bench_search [products]
+
+Seeds a fresh SQLite file (or DATABASE_URL if set) with synthetic products through the
+bulk upsert, then runs each query through the same filter code as list_products, with
+the index enabled and disabled.
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+import statistics
+
+PRODUCTS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+REPEAT = 5
+
+if not os.getenv("DATABASE_URL"):
+    _tmp = tempfile.mkdtemp(prefix="bench_search_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+
+from app.database import SessionLocal, init_db  # noqa: E402
+from app import models, search  # noqa: E402
+from app.bulk import upsert_products  # noqa: E402
+
+WORDS = ["steel", "widget", "bracket", "cable", "adapter", "premium", "compact", "wireless", "mount", "charger",
+         "organic", "cotton", "leather", "ceramic", "bamboo", "outdoor", "kitchen", "garden", "travel", "studio"]
+# Common words match ~15% of rows; model-code fragments are what a search box usually narrows to
+QUERIES = [
+    ("name", "widget"),
+    ("name", "wireless charger"),
+    ("name", "K7Q2"),
+    ("name", "Q2X"),
+    ("description", "bamboo"),
+    ("description", "xyzzy"),
+]
+
+def seed(n: int):
+    rnd = random.Random(7)
+    db = SessionLocal()
+    try:
+        for start in range(0, n, 5000):
+            rows = []
+            for i in range(start, min(n, start + 5000)):
+                code = "".join(rnd.choices("ABCDEFGHJKLMNPQRSTUVWXYZ23456789", k=6))
+                name = " ".join(rnd.sample(WORDS, 3)).title() + f" {code}"
+                desc = " ".join(rnd.choices(WORDS, k=20))
+                rows.append({"sku": f"SKU-{i}", "sku_lower": f"sku-{i}", "name": name, "description": desc})
+            upsert_products(db, rows)
+            db.commit()
+    finally:
+        db.close()
+
+def run_query(col: str, term: str, ranked: bool) -> float:
+    db = SessionLocal()
+    try:
+        kwargs = {"name": term if col == "name" else None, "description": term if col == "description" else None}
+        q = search.apply_text_search(db.query(models.Product), **kwargs)
+        if ranked:
+            q = q.order_by(*search.relevance_order(**kwargs))
+        start = time.perf_counter()
+        q.count()
+        q.order_by(models.Product.id.desc()).limit(20).all()
+        return (time.perf_counter() - start) * 1000
+    finally:
+        db.close()
+
+def main():
+    init_db()
+    db = SessionLocal()
+    existing = db.query(models.Product).count()
+    db.close()
+    if existing < PRODUCTS:
+        start = time.perf_counter()
+        seed(PRODUCTS)
+        print(f"seeded {PRODUCTS:,} products in {time.perf_counter() - start:.1f}s")
+    indexed = search.backend
+    print(f"search backend: {indexed}")
+    for col, term in QUERIES:
+        for label, backend in (("scan", None), ("index", indexed)):
+            search.backend = backend
+            times = [run_query(col, term, ranked=False) for _ in range(REPEAT)]
+            ranked = run_query(col, term, ranked=True)
+            print(f"{col}={term!r:<20} {label:>5}: median {statistics.median(times):8.1f} ms   ranked {ranked:8.1f} ms")
+    search.backend = indexed
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Compare the legacy per-row ORM import loop with the set-based bulk upsert.
+
+Usage: python -m bench.bench_upsert [rows] [batch_size]
+
+Runs both paths three times against fresh SQLite files (or DATABASE_URL if set): on an
+empty table (all inserts), re-importing the same rows (all unchanged) and re-importing
+them with new names (all updates).
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+BATCH = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+if not os.getenv("DATABASE_URL"):
+    _tmp = tempfile.mkdtemp(prefix="bench_upsert_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+
+from app.database import SessionLocal, init_db  # noqa: E402
+from app import models  # noqa: E402
+from app.bulk import ProductBatch, upsert_products  # noqa: E402
+
+def make_rows(n: int, version: int = 1):
+    return [{"sku": f"SKU-{i}", "name": f"Product {i} v{version}", "description": f"Description for product {i}"} for i in range(n)]
+
+def legacy_import(db, rows):
+    # The pre-bulk importer: one SELECT per row, ORM objects flushed per commit
+    batch = 0
+    for row in rows:
+        sku = row["sku"].strip()
+        sku_lower = sku.lower()
+        existing = db.query(models.Product).filter(models.Product.sku_lower == sku_lower).one_or_none()
+        if existing:
+            existing.sku = sku
+            existing.name = row["name"].strip()
+            existing.description = row["description"].strip()
+            existing.updated_at = datetime.utcnow()
+        else:
+            db.add(models.Product(sku=sku, sku_lower=sku_lower, name=row["name"].strip(), description=row["description"].strip(), active=True))
+        batch += 1
+        if batch >= BATCH:
+            db.commit()
+            batch = 0
+    db.commit()
+
+def bulk_import(db, rows):
+    batch = ProductBatch()
+    for row in rows:
+        batch.add(row)
+        if len(batch) >= BATCH:
+            upsert_products(db, batch.rows.values())
+            db.commit()
+            batch.clear()
+    if len(batch):
+        upsert_products(db, batch.rows.values())
+        db.commit()
+
+def timed(fn, rows) -> float:
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        fn(db, rows)
+        return len(rows) / (time.perf_counter() - start)
+    finally:
+        db.close()
+
+def clear():
+    db = SessionLocal()
+    try:
+        db.query(models.Product).delete()
+        db.commit()
+    finally:
+        db.close()
+
+def main():
+    init_db()
+    rows = make_rows(ROWS)
+    changed = make_rows(ROWS, version=2)
+    print(f"rows={ROWS} batch={BATCH}")
+    for label, fn in (("legacy", legacy_import), ("bulk", bulk_import)):
+        clear()
+        insert_rate = timed(fn, rows)
+        same_rate = timed(fn, rows)
+        update_rate = timed(fn, changed)
+        print(f"{label:>7}: insert {insert_rate:>10,.0f} rows/s   unchanged {same_rate:>10,.0f} rows/s   update {update_rate:>10,.0f} rows/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Write throughput on SQLite under mixed load, with and without the single-writer thread.
+
+Usage: python -m bench.bench_writer [rows] [--writers 32] [--seconds 60]
+
+Each variant runs in a fresh subprocess and SQLite file (SQLITE_WRITER=true / false): a CSV
+import of ``rows`` rows runs while ``--writers`` threads keep making small writes (one product
+update each, through app.writer.write like the CRUD routes) until the import finishes or
+``--seconds`` pass. Reports both throughputs, small-write latency and failed writes.
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+def run_variant(rows: int, writers: int, seconds: float):
+    # Runs inside the subprocess; DATABASE_URL and SQLITE_WRITER come from the parent
+    from app.database import SessionLocal, init_db
+    from app.bulk import upsert_products
+    from app.writer import write
+    from app import models, tasks
+
+    init_db()
+    db = SessionLocal()
+    upsert_products(db, [{"sku": f"HOT-{i}", "sku_lower": f"hot-{i}", "name": "hot", "description": ""} for i in range(1000)])
+    db.commit()
+    ids = [r[0] for r in db.query(models.Product.id)]
+    job_id = uuid.uuid4().hex
+    db.add(models.JobProgress(id=job_id))
+    db.commit()
+    db.close()
+    csv_path = os.path.join(os.path.dirname(os.environ["DATABASE_URL"][len("sqlite:///"):]), "catalog.csv")
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write("sku,name,description\n")
+        for i in range(rows):
+            f.write(f"SKU-{i},Product {i},Description for product {i}\n")
+
+    done = threading.Event()
+    latencies: list[float] = []
+    errors = 0
+
+    def rename(s, product_id: int, name: str):
+        s.get(models.Product, product_id).name = name
+        s.flush()
+
+    def small_writes(seed: int):
+        nonlocal errors
+        rnd = random.Random(seed)
+        session = SessionLocal()
+        try:
+            while not done.is_set():
+                start = time.perf_counter()
+                try:
+                    write(session, rename, rnd.choice(ids), f"hot {rnd.random()}")
+                    latencies.append(time.perf_counter() - start)
+                except Exception:
+                    session.rollback()
+                    errors += 1
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=small_writes, args=(i,)) for i in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    importer = threading.Thread(target=tasks.import_csv_background, args=(job_id, csv_path, "batch"))
+    importer.start()
+    importer.join(seconds)
+    import_secs = time.perf_counter() - start
+    done.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    db = SessionLocal()
+    job = db.get(models.JobProgress, job_id)
+    imported = job.processed_rows
+    db.close()
+    print(
+        f"{'writer' if os.environ['SQLITE_WRITER'] == 'true' else 'direct':>6}: "
+        f"import {imported / import_secs:>8,.0f} rows/s ({job.status})"
+        f"  small writes {len(latencies) / elapsed:>7,.0f}/s"
+        f"  p50 {percentile(latencies, 0.5) * 1000:>6.1f} ms  p99 {percentile(latencies, 0.99) * 1000:>7.1f} ms"
+        f"  failed {errors}",
+        flush=True,
+    )
+    importer.join()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("rows", nargs="?", type=int, default=100_000)
+    parser.add_argument("--writers", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--variant", choices=("true", "false"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.variant:
+        run_variant(args.rows, args.writers, args.seconds)
+        return
+    print(f"rows={args.rows} writers={args.writers}")
+    for variant in ("false", "true"):
+        tmp = tempfile.mkdtemp(prefix="bench_writer_")
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}", SQLITE_WRITER=variant)
+        cmd = [sys.executable, "-m", "bench.bench_writer", str(args.rows), "--writers", str(args.writers),
+               "--seconds", str(args.seconds), "--variant", variant]
+        subprocess.run(cmd, env=env, check=True)
+
+if __name__ == "__main__":
+    main()
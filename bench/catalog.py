@@ -0,0 +1,69 @@
+"""Synthetic product catalogs for import benchmarks.
+
+Usage: python -m bench.catalog path rows [--dup-ratio R] [--case-ratio R] [--long-ratio R] [--multiline-ratio R] [--seed N]
+
+Rows are written as they are generated, so 10M-row files never sit in memory. Output is
+deterministic for a given seed and set of ratios.
+"""
+import argparse
+import csv
+import random
+
+WORDS = ["steel", "widget", "bracket", "cable", "adapter", "premium", "compact", "wireless", "mount", "charger",
+         "organic", "cotton", "leather", "ceramic", "bamboo", "outdoor", "kitchen", "garden", "travel", "studio"]
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+
+def _case_variant(rnd: random.Random, sku: str) -> str:
+    return "".join(c.swapcase() if c.isalpha() and rnd.random() < 0.5 else c for c in sku)
+
+def _description(rnd: random.Random, long_ratio: float, multiline_ratio: float) -> str:
+    if rnd.random() < long_ratio:
+        # 2-8 KB: spec sheets pasted into the description field
+        text = " ".join(rnd.choices(WORDS, k=rnd.randint(300, 1200)))
+    else:
+        text = " ".join(rnd.choices(WORDS, k=rnd.randint(5, 25)))
+    if rnd.random() < multiline_ratio:
+        # Quoted field with embedded newlines, commas and doubled quotes
+        text = f'{text}\n- size: {rnd.randint(1, 99)}", weight: {rnd.randint(1, 500)}g\n- "care", wipe clean'
+    return text
+
+def generate(path: str, rows: int, dup_ratio: float = 0.1, case_ratio: float = 0.3,
+             long_ratio: float = 0.02, multiline_ratio: float = 0.02, seed: int = 1) -> dict:
+    """Write a catalog CSV and return counts describing it.
+
+    ``dup_ratio`` of rows repeat an earlier SKU; ``case_ratio`` of those repeats change its
+    letter case (still the same product under case-insensitive matching).
+    """
+    rnd = random.Random(seed)
+    unique = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["sku", "name", "description"])
+        for _ in range(rows):
+            if unique and rnd.random() < dup_ratio:
+                sku = f"SKU-{rnd.randrange(unique):08d}-Ax"
+                if rnd.random() < case_ratio:
+                    sku = _case_variant(rnd, sku)
+            else:
+                sku = f"SKU-{unique:08d}-Ax"
+                unique += 1
+            name = " ".join(rnd.sample(WORDS, 3)).title()
+            w.writerow([sku, name, _description(rnd, long_ratio, multiline_ratio)])
+    return {"rows": rows, "unique_skus": unique}
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic product catalog CSV")
+    parser.add_argument("path")
+    parser.add_argument("rows", help="row count, or one of " + ", ".join(SIZES))
+    parser.add_argument("--dup-ratio", type=float, default=0.1)
+    parser.add_argument("--case-ratio", type=float, default=0.3)
+    parser.add_argument("--long-ratio", type=float, default=0.02)
+    parser.add_argument("--multiline-ratio", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rows = SIZES.get(args.rows.lower()) or int(args.rows)
+    info = generate(args.path, rows, args.dup_ratio, args.case_ratio, args.long_ratio, args.multiline_ratio, args.seed)
+    print(f"wrote {info['rows']:,} rows ({info['unique_skus']:,} unique SKUs) to {args.path}")
+
+if __name__ == "__main__":
+    main()
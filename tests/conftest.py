@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+# The app reads its settings at import time: point it at a scratch SQLite file first
+_tmp = tempfile.mkdtemp(prefix="app-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["USE_CELERY"] = "false"
+os.environ["PRODUCT_CACHE_TTL"] = "0"
+os.environ.pop("DATABASE_READ_URL", None)
+
+import pytest
+
+from app import models
+from app.database import SessionLocal, init_db
+
+@pytest.fixture
+def db():
+    init_db()
+    session = SessionLocal()
+    for model in (models.Product, models.ImportChunk, models.JobProgress):
+        session.query(model).delete()
+    session.commit()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def write_csv(tmp_path):
+    def write(text: str, name: str = "catalog.csv") -> str:
+        path = tmp_path / name
+        path.write_bytes(text.encode("utf-8"))
+        return str(path)
+    return write
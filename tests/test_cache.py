@@ -0,0 +1,26 @@
+from app.cache import ProductCache
+
+def _product(product_id: int, sku: str) -> dict:
+    return {"id": product_id, "sku": sku, "name": sku}
+
+def test_load_that_raced_a_write_is_not_stored():
+    cache = ProductCache(ttl=60, redis_url="")
+    generation = cache.generation()
+    cache.invalidate(["a"])
+    cache.put_product("a", _product(1, "A"), generation)
+    assert cache.by_sku("a") is None and cache.by_id(1) is None
+
+def test_invalidation_drops_sku_id_and_list_pages():
+    cache = ProductCache(ttl=60, redis_url="")
+    generation = cache.generation()
+    cache.put_product("a", _product(1, "A"), generation)
+    cache.put_product("missing", None, generation)
+    cache.put_list_page("page-1", {"items": []}, generation)
+    assert cache.by_id(1)["sku"] == "A" and cache.by_sku("missing") == {}
+    assert cache.list_page("page-1", generation) == {"items": []}
+
+    cache.invalidate(["a"])
+
+    assert cache.by_sku("a") is None and cache.by_id(1) is None
+    assert cache.list_page("page-1", cache.generation()) is None
+    assert cache.by_sku("missing") == {}
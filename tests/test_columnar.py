@@ -0,0 +1,38 @@
+import csv
+import io
+
+import pytest
+
+from app import columnar
+from app.bulk import normalize_row
+
+pytestmark = pytest.mark.skipif(columnar.pa is None, reason="pyarrow is not installed")
+
+def _arrow_items(data: bytes) -> list[dict]:
+    fieldnames = data.split(b"\n", 1)[0].decode("utf-8").strip().split(",")
+    items = []
+    for batch in columnar.open_batches(io.BytesIO(data), fieldnames):
+        items.extend(columnar.normalize_batch(batch)[0])
+    return items
+
+def _stdlib_items(data: bytes) -> list[dict]:
+    rows = csv.DictReader(io.StringIO(data.decode("utf-8"), newline=""))
+    return [item for item in map(normalize_row, rows) if item is not None]
+
+@pytest.mark.parametrize("data", [
+    b"sku,name,description\nA1,Widget,Blue\n  b2 ,  Spaced  ,\t tabbed \n",
+    # Empty name falls back to the SKU; rows without a SKU are dropped
+    b"sku,name,description\nC3,,desc\n,Nameless,x\n   ,blank,y\nD4,d,\n",
+    b'sku,name,description\nE5,"Quoted, comma","line one\nline two"\nF6,"say ""hi""",\n',
+    "sku,name,description\nİSTANBUL,Straße,Ünïcödé\nǅemal,x, nbsp \n".encode(),
+    # Column order and extra columns do not matter
+    b"description,extra,sku,name\nd1,zz,G7,g\nd2,yy,H8,\n",
+    b"sku,name,description\r\nI9,crlf,row\r\nJ10,second,row\r\n",
+    b"sku\nK11\nk12\n",
+])
+def test_arrow_matches_stdlib(data):
+    assert _arrow_items(data) == _stdlib_items(data)
+
+def test_bare_carriage_return_falls_back():
+    with pytest.raises(columnar.FALLBACK_ERRORS):
+        _arrow_items(b"sku,name\nA,b\rC,d\n")
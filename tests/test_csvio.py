@@ -0,0 +1,36 @@
+import csv
+
+from app.csvio import ByteLines, read_header, split_ranges
+
+def _records(path: str, start: int, end: int) -> list[list[str]]:
+    # Reads one range the way a parallel import chunk does
+    with open(path, "rb") as f:
+        f.seek(start)
+        return list(csv.reader(ByteLines(f, end - start, start=start)))
+
+def test_split_ranges_keeps_records_whole(write_csv):
+    lines = ["sku,name,description"]
+    for i in range(200):
+        if i % 7 == 0:
+            # A bare quote in an unquoted field is read literally by csv.reader
+            lines.append(f'A{i},5" screen,plain')
+        elif i % 5 == 0:
+            lines.append(f'A{i},"multi, ""quoted""","line one\nline two"')
+        else:
+            lines.append(f"A{i},Product {i},Description {i}")
+    path = write_csv("\n".join(lines) + "\n")
+    _, header_end = read_header(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        expected = list(csv.reader(f))[1:]
+
+    ranges = split_ranges(path, header_end, 8)
+
+    assert len(ranges) == 8
+    assert ranges[0][0] == header_end and ranges[-1][1] == len(open(path, "rb").read())
+    assert all(a < b for a, b in ranges)
+    assert [r for a, b in ranges for r in _records(path, a, b)] == expected
+
+def test_split_ranges_single_part(write_csv):
+    path = write_csv("sku\nA\nB\n")
+    _, header_end = read_header(path)
+    assert split_ranges(path, header_end, 1) == [(header_end, 8)]
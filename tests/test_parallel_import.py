@@ -0,0 +1,55 @@
+from app import models, tasks
+
+def _import(db, job_id: str, path: str):
+    db.add(models.JobProgress(id=job_id))
+    db.commit()
+    tasks.import_csv_background(job_id, path)
+    db.expire_all()
+    return db.get(models.JobProgress, job_id)
+
+def _run_chunks(db, monkeypatch, job_id: str, path: str, order):
+    # Plans a parallel import and runs its chunks in this process, in the given order
+    monkeypatch.setattr(tasks, "IMPORT_WORKERS", 1)
+    db.add(models.JobProgress(id=job_id))
+    db.commit()
+    fieldnames, ranges = tasks._plan_chunks(db, job_id, path)
+    assert len(ranges) == 4
+    return [tasks.import_chunk(job_id, path, fieldnames, *ranges[k]) for k in order]
+
+def _catalog(first: str, last: str) -> str:
+    lines = ["sku,name,description", f"X,{first},same"]
+    lines += [f"F{i},Filler {i},filler" for i in range(400)]
+    lines.append(f"X,{last},same")
+    return "\n".join(lines) + "\n"
+
+def _product(db, sku_lower: str):
+    db.expire_all()
+    return db.query(models.Product).filter(models.Product.sku_lower == sku_lower).one()
+
+def test_last_record_wins_when_it_matches_the_stored_row(db, write_csv, monkeypatch):
+    assert _import(db, "before", write_csv("sku,name,description\nX,C,same\n", "before.csv")).status == "completed"
+    path = write_csv(_catalog("D", "C"))
+
+    # The chunk holding the last record (unchanged against the stored row) finishes first
+    _run_chunks(db, monkeypatch, "parallel", path, order=[3, 2, 1, 0])
+
+    assert _product(db, "x").name == "C"
+
+def test_last_record_wins_in_file_order(db, write_csv, monkeypatch):
+    path = write_csv(_catalog("D", "E"))
+    _run_chunks(db, monkeypatch, "forward", path, order=[0, 1, 2, 3])
+    assert _product(db, "x").name == "E"
+
+def test_counts_add_up_across_chunks(db, write_csv, monkeypatch):
+    path = write_csv(_catalog("D", "D"))
+    results = _run_chunks(db, monkeypatch, "first", path, order=[3, 1, 0, 2])
+    _, _, counts = tasks._sum_results(results)
+    assert counts["inserted"] == db.query(models.Product).count() == 401
+    assert counts["updated"] == 0
+
+    stamps = dict(db.query(models.Product.sku_lower, models.Product.updated_at))
+    results = _run_chunks(db, monkeypatch, "again", path, order=[2, 0, 3, 1])
+    _, _, counts = tasks._sum_results(results)
+    assert counts["inserted"] == counts["updated"] == 0
+    db.expire_all()
+    assert dict(db.query(models.Product.sku_lower, models.Product.updated_at)) == stamps
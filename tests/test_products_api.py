@@ -0,0 +1,13 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+def test_relevance_pages_have_no_cursor(db):
+    with TestClient(app) as client:
+        for i in range(3):
+            assert client.post("/products", json={"sku": f"W{i}", "name": f"widget {i}"}).status_code == 200
+        ranked = client.get("/products", params={"name": "widget", "sort": "relevance", "page_size": 2}).json()
+        assert len(ranked["items"]) == 2 and ranked["next_cursor"] is None
+        by_id = client.get("/products", params={"name": "widget", "page_size": 2}).json()
+        rest = client.get("/products", params={"name": "widget", "page_size": 2, "cursor": by_id["next_cursor"]}).json()
+        assert [p["sku"] for p in by_id["items"] + rest["items"]] == ["W2", "W1", "W0"]
@@ -0,0 +1,63 @@
+import gzip
+
+import pytest
+
+from app import columnar, models, tasks
+
+ROWS = 95
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    monkeypatch.setattr(tasks, "BATCH_SIZE", 10)
+
+def _catalog() -> bytes:
+    lines = ["sku,name,description"]
+    for i in range(ROWS):
+        # Quoted multiline values keep records and physical lines apart
+        lines.append(f'S{i},Product {i},"line one\nline two {i}"' if i % 9 == 0 else f"S{i},Product {i},Description {i}")
+    return ("\n".join(lines) + "\n").encode()
+
+def _upsert_calls(monkeypatch, fail_on: int | None = None) -> list[int]:
+    # Records the size of every upserted batch; optionally fails the fail_on-th call
+    sizes = []
+    real = tasks.upsert_products
+
+    def upsert(db, rows, *args, **kwargs):
+        rows = list(rows)
+        if fail_on is not None and len(sizes) + 1 == fail_on:
+            raise RuntimeError("database went away")
+        sizes.append(len(rows))
+        return real(db, rows, *args, **kwargs)
+
+    monkeypatch.setattr(tasks, "upsert_products", upsert)
+    return sizes
+
+@pytest.mark.parametrize("backend", ["stdlib", "arrow"])
+@pytest.mark.parametrize("compressed", [False, True])
+def test_resume_skips_committed_batches(db, tmp_path, monkeypatch, small_batches, backend, compressed):
+    if backend == "arrow" and columnar.pa is None:
+        pytest.skip("pyarrow is not installed")
+    monkeypatch.setattr(columnar, "IMPORT_CSV_BACKEND", backend)
+    path = tmp_path / "catalog.csv"
+    path.write_bytes(gzip.compress(_catalog()) if compressed else _catalog())
+    db.add(models.JobProgress(id="job"))
+    db.commit()
+
+    with monkeypatch.context() as m:
+        first = _upsert_calls(m, fail_on=4)
+        tasks.import_csv_background("job", str(path))
+    db.expire_all()
+    job = db.get(models.JobProgress, "job")
+    assert job.status == "failed"
+    assert job.checkpoint_rows == sum(first) == 30
+
+    resumed = _upsert_calls(monkeypatch)
+    assert tasks.import_csv_background("job", str(path)) == "completed"
+    assert sum(resumed) == ROWS - 30
+
+    db.expire_all()
+    job = db.get(models.JobProgress, "job")
+    assert (job.processed_rows, job.total_rows, job.inserted_rows) == (ROWS, ROWS, ROWS)
+    names = dict(db.query(models.Product.sku, models.Product.description))
+    assert len(names) == ROWS
+    assert names["S9"] == "line one\nline two 9"
@@ -0,0 +1,31 @@
+import threading
+
+import pytest
+
+from app import models
+from app.writer import SQLiteWriter
+
+def _add(db, sku: str):
+    db.add(models.Product(sku=sku, sku_lower=sku.lower(), name=sku))
+    db.flush()
+
+def test_failing_write_rolls_back_alone(db):
+    writer = SQLiteWriter()
+    release = threading.Event()
+    # Holds the writer thread so the next calls queue up and commit as one group
+    blocker = writer.submit(lambda s: release.wait(5))
+    try:
+        first = writer.submit(_add, "A")
+        duplicate = writer.submit(_add, "A")
+        last = writer.submit(_add, "B")
+        release.set()
+        blocker.result(5)
+        first.result(5)
+        last.result(5)
+        with pytest.raises(Exception):
+            duplicate.result(5)
+    finally:
+        release.set()
+        writer.shutdown()
+
+    assert sorted(p.sku for p in db.query(models.Product)) == ["A", "B"]